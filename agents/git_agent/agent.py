@@ -1,16 +1,38 @@
 from __future__ import annotations
 
+import functools
 import os
+import re
 import shlex
 import shutil
+import string
 import subprocess  # nosec B404 - controlled CLI usage
+import sys
+from collections.abc import Callable
 from pathlib import Path
 
+# branch-name sanitizer: drop anything but word chars/separators, collapse separator runs
+_SLUG_DROP_RE = re.compile(r"[^\w /-]")
+_SLUG_SEP_RE = re.compile(r"[ _/-]+")
+# text made only of these (no edge/double dashes) is already a slug
+_SLUG_CLEAN = frozenset(string.ascii_lowercase + string.digits + "-")
+# ASCII equivalent of the two regexes as one str.translate: keep [a-z0-9], separators -> "-",
+# drop the rest (uppercase never reaches it: input is lowered first)
+_SLUG_TABLE = str.maketrans(
+    {chr(c): None for c in range(128)}
+    | {c: c for c in string.ascii_lowercase + string.digits}
+    | {c: "-" for c in " _/-"}
+)
+
 # --- lightweight git helpers -------------------------------------------------
 
 
 def _run(
-    cmd: list[str], *, cwd: Path | None = None, env: dict | None = None
+    cmd: list[str],
+    *,
+    cwd: Path | None = None,
+    env: dict | None = None,
+    input: str | None = None,
 ) -> tuple[int, str, str]:
     """Run command and return (rc, stdout, stderr)."""
     try:
@@ -18,6 +40,7 @@ def _run(
             cmd,  # nosec B603 - static arg list, no user input
             cwd=str(cwd) if cwd else None,
             env={**os.environ, **(env or {})} if env else None,
+            input=input,
             capture_output=True,  # noqa: S603
             text=True,
             check=False,
@@ -32,6 +55,15 @@ def git(cmd: str, *, cwd: Path) -> tuple[int, str, str]:
     return _run(["git", *shlex.split(cmd)], cwd=cwd)
 
 
+def git_script(repo: Path, cmds: list[str]) -> tuple[int, str, str]:
+    """
+    Run several git commands in a single `sh -c` (joined with &&).
+    Saves one fork/exec round-trip per command on short, chatty sequences.
+    Callers must shlex.quote() anything interpolated into `cmds`.
+    """
+    return _run(["sh", "-c", " && ".join(cmds)], cwd=repo)
+
+
 def add_all_safe(repo: Path) -> None:
     rc, _out, err = git("add -A", cwd=repo)
     if rc != 0:
@@ -58,23 +90,67 @@ def ensure_git_identity(
             raise RuntimeError(f"git config user.email failed: {err}")
 
 
-def commit_all(repo: Path, msg: str, sign: bool) -> None:
-    add_all_safe(repo)
+def commit_all(repo: Path, msg: str, sign: bool, *, stage: bool = True) -> None:
+    if stage:
+        add_all_safe(repo)
     ensure_git_identity(repo)
-    sign_flag = "-S" if sign else ""
-    rc, _out, err = git(f"commit {sign_flag} -m {shlex.quote(msg)}", cwd=repo)
+    # message goes over stdin: no shell quoting/re-splitting of multi-line text
+    cmd = ["git", "commit", *(["-S"] if sign else []), "-F", "-"]
+    rc, _out, err = _run(cmd, cwd=repo, input=msg)
     if rc != 0:
         if "Author identity unknown" in (err or ""):
             ensure_git_identity(repo)
-            rc, _out, err = git(f"commit {sign_flag} -m {shlex.quote(msg)}", cwd=repo)
+            rc, _out, err = _run(cmd, cwd=repo, input=msg)
         if rc != 0:
             raise RuntimeError(err or "git commit failed")
 
 
+# --- branch names -------------------------------------------------------------
+
+
+BranchFormatter = Callable[[str], str]
+
+BRANCH_PATTERNS = {"feature": "feat/{scope}"}
+
+
+def _format_scope(pattern: str, scope: str) -> str:
+    return pattern.format_map({"scope": scope})
+
+
+def _concat_scope(prefix: str, suffix: str, scope: str) -> str:
+    return prefix + scope + suffix
+
+
+def compile_branch_pattern(pattern: str) -> BranchFormatter:
+    """
+    Turn a branch pattern like "feat/{scope}" into a scope -> name callable.
+    The common single-`{scope}` shape becomes plain concatenation (no format parsing per call);
+    anything fancier falls back to str.format_map.
+    """
+    prefix, sep, suffix = pattern.partition("{scope}")
+    if sep and not any(c in prefix + suffix for c in "{}"):
+        return functools.partial(_concat_scope, prefix, suffix)
+    return functools.partial(_format_scope, pattern)
+
+
+_BRANCH_FORMATS: dict[str, BranchFormatter] = {
+    sys.intern(kind): compile_branch_pattern(pat) for kind, pat in BRANCH_PATTERNS.items()
+}
+
+
+def branch_name(kind: str, scope: str) -> str:
+    fmt = _BRANCH_FORMATS.get(kind)
+    if fmt is None:
+        return f"{kind}/{scope}"
+    return fmt(scope)
+
+
 # --- quality helpers ----------------------------------------------------------
 
 
+@functools.cache
 def _which(name: str) -> str | None:
+    """PATH lookup, resolved once per tool for the life of the process."""
     return shutil.which(name)
 
 
@@ -85,38 +161,91 @@ def _has_tests(repo: Path) -> bool:
     return False
 
 
+# keys stripped from the environment handed to the target repo's test run
+_TEST_ENV_DROP = frozenset({"API_KEYS"})
+
+
+def _test_env() -> dict[str, str]:
+    """
+    os.environ without API_KEYS, for the target repo's test run.
+    Only the drop list is static; the environment itself is read per call so PATH/VIRTUAL_ENV
+    changes made by this process reach the pytest child.
+    """
+    return {k: v for k, v in os.environ.items() if k not in _TEST_ENV_DROP}
+
+
+def _spawn(cmd: list[str], *, cwd: Path, env: dict | None = None) -> subprocess.Popen[str] | None:
+    """Start a tool without waiting; `env` is the full environment (None inherits)."""
+    try:
+        return subprocess.Popen(
+            cmd,  # nosec B603 - static arg list, no user input
+            cwd=str(cwd),
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    except FileNotFoundError:
+        return None
+
+
+def _black_in_process(repo: Path) -> int | None:
+    """
+    Run black on `repo` inside this interpreter (no extra Python startup).
+    Returns its exit code, or None when black is not importable here.
+    """
+    try:
+        import black
+    except ImportError:
+        return None
+    try:
+        black.main(["-q", str(repo)])
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(bool(e.code))
+    return 0
+
+
 def run_quality(repo: Path) -> None:
     """
     Run local quality tools if available.
     Default: non-fatal. Opt into strict with GIT_AGENT_STRICT_LINT=1.
-    - ruff check .
-    - black .        (format, not --check)
-    - pytest -q      (ONLY if GIT_AGENT_RUN_PYTEST=1 and tests exist)
+    - black .        (format, not --check; in-process when importable; runs first since it
+                      rewrites files)
+    - ruff check .   (concurrently with pytest; both only read the tree)
+    - pytest -q      (ONLY if GIT_AGENT_RUN_PYTEST=1 and tests exist; kept as a subprocess
+                      so the target repo's tests get a scrubbed env and a clean interpreter)
     """
-    env = os.environ.copy()
-    env.pop("API_KEYS", None)
-
     strict = os.getenv("GIT_AGENT_STRICT_LINT", "0").lower() in {"1", "true", "yes"}
 
-    ruff = _which("ruff")
-    if ruff:
-        rc, out, err = _run([ruff, "check", "."], cwd=repo)
+    # format in-place so temporary repos pass style
+    rc = _black_in_process(repo)
+    if rc is not None:
         if strict and rc != 0:
-            raise subprocess.CalledProcessError(rc, [ruff, "check", "."], out, err)
-
-    black = _which("black")
-    if black:
-        # format in-place so temporary repos pass style
+            raise subprocess.CalledProcessError(rc, ["black", "."])
+    elif black := _which("black"):
         rc, out, err = _run([black, "."], cwd=repo)
         if strict and rc != 0:
             raise subprocess.CalledProcessError(rc, [black, "."], out, err)
 
+    jobs: list[tuple[list[str], dict | None]] = []
+    ruff = _which("ruff")
+    if ruff:
+        jobs.append(([ruff, "check", "."], None))
     if os.getenv("GIT_AGENT_RUN_PYTEST", "0").lower() in {"1", "true", "yes"} and _has_tests(repo):
         pt = _which("pytest")
         if pt:
-            rc, out, err = _run([pt, "-q"], cwd=repo, env=env)
-            if strict and rc != 0:
-                raise subprocess.CalledProcessError(rc, [pt, "-q"], out, err)
+            jobs.append(([pt, "-q"], _test_env()))
+
+    running = [(cmd, _spawn(cmd, cwd=repo, env=job_env)) for cmd, job_env in jobs]
+    failures: list[subprocess.CalledProcessError] = []
+    for cmd, proc in running:
+        if proc is None:
+            continue
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            failures.append(subprocess.CalledProcessError(proc.returncode, cmd, out, err))
+    if strict and failures:
+        raise failures[0]
 
 
 # --- Agent --------------------------------------------------------------------
@@ -141,15 +270,15 @@ class GitIntegrationAgent:
 
     @staticmethod
     def _slug(text: str) -> str:
-        out = []
-        for ch in text.lower():
-            if ch.isalnum():
-                out.append(ch)
-            elif ch in (" ", "_", "-", "/"):
-                out.append("-")
-        slug = "".join(out).strip("-")
-        while "--" in slug:
-            slug = slug.replace("--", "-")
+        low = text.lower()
+        # common case ("api", "ready-probe"): nothing to strip, skip both regex passes
+        if low and _SLUG_CLEAN.issuperset(low) and "--" not in low and low.strip("-") == low:
+            return low
+        if low.isascii():
+            # split/join collapses dash runs and trims the edges in one pass
+            slug = "-".join(filter(None, low.translate(_SLUG_TABLE).split("-")))
+        else:
+            slug = _SLUG_SEP_RE.sub("-", _SLUG_DROP_RE.sub("", low)).strip("-")
         return slug or "change"
 
     def feature_commit(self, scope: str, title: str, body: str) -> str:
@@ -159,14 +288,17 @@ class GitIntegrationAgent:
         """
         scope = (scope or "feat").strip()
         title = (title or "update").strip()
-        branch = f"feat/{self._slug(scope)}-{self._slug(title)}"
-
-        # checkout from 'dev' if exists; else create from HEAD
-        rc, _out, _err = git("show-ref --verify --quiet refs/heads/dev", cwd=self.repo)
-        if rc == 0:
-            rc, out, err = git(f"checkout -b {shlex.quote(branch)} dev", cwd=self.repo)
-        else:
-            rc, out, err = git(f"checkout -b {shlex.quote(branch)}", cwd=self.repo)
+        branch = branch_name("feature", f"{self._slug(scope)}-{self._slug(title)}")
+
+        # one shell: branch from dev if it exists, else HEAD; then stage
+        rc, out, err = git_script(
+            self.repo,
+            [
+                "{ git show-ref --verify --quiet refs/heads/dev && start=dev || start=HEAD; }",
+                f'git checkout -b {shlex.quote(branch)} "$start"',
+                "git add -A",
+            ],
+        )
         if rc != 0:
             raise RuntimeError(err or out or "git checkout failed")
 
@@ -175,7 +307,7 @@ class GitIntegrationAgent:
             msg_lines.append(body)
         msg = "\n".join(msg_lines)
 
-        commit_all(self.repo, msg, self.cfg.sign)
+        commit_all(self.repo, msg, self.cfg.sign, stage=False)
 
         # quality hooks (non-fatal unless strict requested)
         run_quality(self.repo)
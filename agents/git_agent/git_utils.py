@@ -5,6 +5,15 @@ import re
 import shlex
 import subprocess  # nosec B404: used with shell=False and static args
 from pathlib import Path
+from typing import Any
+
+try:  # optional: C-accelerated PyYAML
+    import yaml
+
+    _YamlLoader: Any = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+except ImportError:  # pragma: no cover - fallback parser below
+    yaml = None  # type: ignore[assignment]
+    _YamlLoader = None
 
 FORBIDDEN_PATTERNS = [
     r"\.run(/|$)",
@@ -148,7 +157,45 @@ def gh_available() -> bool:
     return rc == 0
 
 
+_ENV_REF_RE = re.compile(r"\$\{([A-Z0-9_]+)(:-([^}]*))?\}")
+
+
+def _expand_env(v: str) -> str:
+    """${ENV:-default} -> value of ENV (or default) when the value starts with a reference."""
+    m = _ENV_REF_RE.match(v)
+    if m:
+        return os.environ.get(m.group(1), m.group(3) or "")
+    return v
+
+
+def _expand_tree(node: Any) -> Any:
+    if isinstance(node, str):
+        return _expand_env(node)
+    if isinstance(node, dict):
+        return {k: _expand_tree(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_expand_tree(v) for v in node]
+    return node
+
+
 def load_yaml_like(path: Path) -> dict:
+    """
+    Load a YAML config with ${ENV:-default} expansion on string values.
+    Uses PyYAML's C loader when available; otherwise the simple subset parser below.
+    """
+    if not path.exists():
+        return {}
+    if _YamlLoader is not None:
+        try:
+            with path.open("rb") as fh:
+                data = yaml.load(fh, Loader=_YamlLoader)  # nosec B506 - SafeLoader family
+        except yaml.YAMLError:
+            return _load_yaml_subset(path)
+        return _expand_tree(data) if isinstance(data, dict) else {}
+    return _load_yaml_subset(path)
+
+
+def _load_yaml_subset(path: Path) -> dict:
     """
     Simple YAML-subset loader (keys/strings only).
     Supports ${ENV:-default} expansion.
@@ -157,45 +204,36 @@ def load_yaml_like(path: Path) -> dict:
     if not path.exists():
         return data
 
-    content = path.read_text()
     cur_map = data
     stack: list[tuple[int, dict]] = [(-1, cur_map)]
 
-    for raw in content.splitlines():
-        line = raw.rstrip("\n")
-        if not line.strip() or line.strip().startswith("#"):
-            continue
-
-        indent = len(line) - len(line.lstrip(" "))
-        while stack and indent <= stack[-1][0]:
-            stack.pop()
-
-        key, sep, val = line.strip().partition(":")
-        if not sep:
-            continue
-
-        val = val.strip()
-        if val == "":
-            new_map: dict = {}
-            stack[-1][1][key] = new_map
-            stack.append((indent, new_map))
-            continue
-
-        if val.startswith('"') and val.endswith('"'):
-            val = val[1:-1]
-        if val.startswith("'") and val.endswith("'"):
-            val = val[1:-1]
-
-        # ${ENV:-default}
-        def expand(v: str) -> str:
-            m = re.match(r"\$\{([A-Z0-9_]+)(:-([^}]*))?\}", v)
-            if m:
-                envk = m.group(1)
-                dflt = m.group(3) or ""
-                return os.environ.get(envk, dflt)
-            return v
-
-        val = expand(val)
-        stack[-1][1][key] = val
+    # stream the file line by line instead of read_text().splitlines()
+    with path.open(encoding="utf-8") as fh:
+        for raw in fh:
+            line = raw.rstrip("\r\n")
+            if not line.strip() or line.strip().startswith("#"):
+                continue
+
+            indent = len(line) - len(line.lstrip(" "))
+            while stack and indent <= stack[-1][0]:
+                stack.pop()
+
+            key, sep, val = line.strip().partition(":")
+            if not sep:
+                continue
+
+            val = val.strip()
+            if val == "":
+                new_map: dict = {}
+                stack[-1][1][key] = new_map
+                stack.append((indent, new_map))
+                continue
+
+            if val.startswith('"') and val.endswith('"'):
+                val = val[1:-1]
+            if val.startswith("'") and val.endswith("'"):
+                val = val[1:-1]
+
+            stack[-1][1][key] = _expand_env(val)
 
     return data
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Any, Dict, Callable
-import inspect
+import functools
+import types
 
 
 # Your simple payload-only handler
@@ -10,22 +11,45 @@ def plan_handler(payload: Dict[str, Any]) -> Dict[str, Any]:
     return {"ok": True, "marker": "local-tasks-plan", "plan": f"{idea} via {module}"}
 
 
+def _payload_only(
+    fn: Callable[[Dict[str, Any]], Dict[str, Any]], name: str, payload: Dict[str, Any]
+) -> Dict[str, Any]:
+    return fn(payload)
+
+
+# inspect.CO_VARARGS / inspect.CO_VARKEYWORDS, without importing inspect at startup
+_CO_VARARGS = 0x04
+_CO_VARKEYWORDS = 0x08
+
+
 def _wrap_if_needed(
     fn: Callable[..., Dict[str, Any]],
 ) -> Callable[[str, Dict[str, Any]], Dict[str, Any]]:
     """
     Ensure the function conforms to (name, payload) -> dict expected by the worker's agents map.
-    If `fn` only accepts (payload), wrap it.
+    If `fn` only accepts (payload), wrap it (once, at registration).
     """
-    try:
-        params = list(inspect.signature(fn).parameters.values())
-    except Exception:
-        # If we can't inspect, assume payload-only
-        return lambda name, payload: fn(payload)
-
-    if len(params) == 1:
-        return lambda name, payload: fn(payload)
-    return fn  
+    # bound methods forward __code__ from __func__, whose co_argcount includes self
+    func, bound = (fn.__func__, 1) if isinstance(fn, types.MethodType) else (fn, 0)
+    code = getattr(func, "__code__", None)
+    if (
+        code is not None
+        and not code.co_kwonlyargcount
+        and not code.co_flags & (_CO_VARARGS | _CO_VARKEYWORDS)
+    ):
+        argc = code.co_argcount - bound  # no *args/**kwargs: no inspect needed
+    else:
+        import inspect  # deferred: sitecustomize loads this module on every interpreter start
+
+        try:
+            argc = len(inspect.signature(fn).parameters)
+        except Exception:
+            # If we can't inspect, assume payload-only
+            return functools.partial(_payload_only, fn)
+
+    if argc == 1:
+        return functools.partial(_payload_only, fn)
+    return fn
 
 
 def register(
@@ -1,15 +1,24 @@
 from __future__ import annotations
 
 import sys
+import atexit
 import logging
+import functools
 import importlib
-import inspect
-import json
-import time
+import importlib.abc
+import importlib.machinery
+import os
+import sqlite3
 import threading
+import types
 from contextlib import suppress
 from typing import Any, Callable
 
+try:  # optional: faster JSON decode for job payloads
+    from orjson import loads as _json_loads
+except ImportError:  # pragma: no cover
+    from json import loads as _json_loads
+
 # ------------------------------------------------------------------------------
 # Logging
 # ------------------------------------------------------------------------------
@@ -24,60 +33,115 @@ for p in ("/app", "/app/src"):
         sys.path.insert(0, p)
 
 
+def _cached_import(name: str, *, import_missing: bool = True) -> Any:
+    """
+    sys.modules first, import machinery only on a miss.
+    With import_missing=False a miss raises ImportError without touching the finders.
+    """
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    if not import_missing:
+        raise ImportError(f"{name} not imported yet")
+    return importlib.import_module(name)
+
+
 # ------------------------------------------------------------------------------
 # Helper: adapt any handler to the worker's expected (name, payload) -> dict shape
 # ------------------------------------------------------------------------------
+def _call_payload_only(
+    fn: Callable[..., Any], name: str, payload: dict[str, Any]
+) -> dict[str, Any]:
+    out = fn(payload)
+    return out if isinstance(out, dict) else {"ok": True, "data": out}
+
+
+def _call_both(fn: Callable[..., Any], name: str, payload: dict[str, Any]) -> dict[str, Any]:
+    out = fn(name, payload)
+    return out if isinstance(out, dict) else {"ok": True, "data": out}
+
+
+_CO_VARARGS = 0x04
+_CO_VARKEYWORDS = 0x08
+
+
+def _positional_arity(fn: Callable[..., Any]) -> int | None:
+    """
+    Positional parameter count read straight from the code object (unwrapping partials
+    and bound methods). None when that is not enough to decide (*args/**kwargs, kw-only,
+    builtins, callable objects) and a full signature is needed.
+    """
+    bound = 0
+    while isinstance(fn, functools.partial):
+        if fn.keywords:
+            return None
+        bound += len(fn.args)
+        fn = fn.func
+    if isinstance(fn, types.MethodType):
+        bound += 1
+        fn = fn.__func__
+    code = getattr(fn, "__code__", None)
+    if code is None or code.co_kwonlyargcount or code.co_flags & (_CO_VARARGS | _CO_VARKEYWORDS):
+        return None
+    return code.co_argcount - bound
+
+
+@functools.lru_cache(maxsize=None)
 def _adapt_handler(fn: Callable[..., Any]) -> Callable[[str, dict[str, Any]], dict[str, Any]]:
     """
     Accept a handler that may be either:
       - fn(payload) -> dict | Any
       - fn(name, payload) -> dict | Any
     and adapt it to the worker's (name, payload) -> dict form.
-    """
-    try:
-        params = list(inspect.signature(fn).parameters.values())
-        if len(params) == 1:  # payload-only
 
-            def _wrapped(name: str, payload: dict[str, Any]) -> dict[str, Any]:
-                out = fn(payload)
-                return out if isinstance(out, dict) else {"ok": True, "data": out}
-
-            return _wrapped
-    except Exception:
-        # If introspection fails, assume payload-only
-        def _wrapped(name: str, payload: dict[str, Any]) -> dict[str, Any]:
-            out = fn(payload)
-            return out if isinstance(out, dict) else {"ok": True, "data": out}
+    Arity is inspected once per handler at registration; the returned partial
+    dispatches straight to the right call shape on every job.
+    """
+    argc = _positional_arity(fn)
+    if argc is None:
+        import inspect  # only for callables the code-object fast path can't read
 
-        return _wrapped
+        try:
+            argc = len(inspect.signature(fn).parameters)
+        except Exception:
+            # If introspection fails, assume payload-only
+            return functools.partial(_call_payload_only, fn)
 
+    if argc == 1:  # payload-only
+        return functools.partial(_call_payload_only, fn)
     # Already (name, payload) form (or something compatible)
-    def _wrapped(name: str, payload: dict[str, Any]) -> dict[str, Any]:
-        out = fn(name, payload)
-        return out if isinstance(out, dict) else {"ok": True, "data": out}
-
-    return _wrapped
+    return functools.partial(_call_both, fn)
 
 
 # ------------------------------------------------------------------------------
 # Step 1: Register local tasks into services.agents.HANDLERS
 # ------------------------------------------------------------------------------
 def _install_local_handlers() -> None:
+    # opt-out for processes that never run jobs: skips importing local_tasks/services.agents
+    if os.getenv("LOCAL_TASKS_ENABLE", "1").strip().lower() in {"0", "false", "no", "off"}:
+        log.debug("sitecustomize: local_tasks overlay disabled")
+        return
     try:
-        lt = importlib.import_module("local_tasks")
+        lt = _cached_import("local_tasks")
     except Exception as e:
         log.info("local_tasks import failed: %r", e)
         return
 
     try:
-        agents = importlib.import_module("services.agents")
+        agents = _cached_import("services.agents")
         handlers = getattr(agents, "HANDLERS", None)
         if not isinstance(handlers, dict):
             raise RuntimeError("services.agents.HANDLERS is not a dict")
 
+        # canonical (normalized, interned) keys when services.agents provides them
+        agents_register = getattr(agents, "register", None)
+
         # Registration callback we pass to local_tasks.register()
         def _register(name: str, fn: Callable[..., Any]) -> None:
-            handlers[name] = _adapt_handler(fn)
+            if callable(agents_register):
+                agents_register(name, _adapt_handler(fn))
+            else:
+                handlers[name] = _adapt_handler(fn)
 
         if hasattr(lt, "register") and callable(getattr(lt, "register")):
             # Preferred: local_tasks.register(register_fn)
@@ -102,13 +166,89 @@ def _install_local_handlers() -> None:
 # ------------------------------------------------------------------------------
 # Step 2: Patch worker_entry._db_pop_one so it reads the 'payload' column
 # ------------------------------------------------------------------------------
-def _try_patch_pop() -> bool:
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+_tls = threading.local()
+
+
+def _thread_con(connect: Callable[[], sqlite3.Connection]) -> sqlite3.Connection:
+    """Per-thread persistent connection (for a worker_entry without its own)."""
+    con: sqlite3.Connection | None = getattr(_tls, "con", None)
+    if con is None:
+        con = _tls.con = connect()
+        atexit.register(con.close)
+    return con
+
+
+def _reset_thread_con() -> None:
+    con, _tls.con = getattr(_tls, "con", None), None
+    if con is not None:
+        with suppress(Exception):
+            con.close()
+
+
+def _claim_one(con: sqlite3.Connection) -> Any:
+    """Flip the oldest queued row to 'working' in one IMMEDIATE transaction."""
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    if _HAS_RETURNING:
+        cur.execute(
+            """
+            UPDATE jobs
+               SET status='working'
+             WHERE id = (SELECT id FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1)
+            RETURNING id, CAST(task AS BLOB), CAST(payload AS BLOB), key
+            """
+        )
+        rows = cur.fetchall()
+    else:
+        cur.execute(
+            """
+            SELECT id, CAST(task AS BLOB), CAST(payload AS BLOB), key
+              FROM jobs
+             WHERE status='queued'
+             ORDER BY id ASC
+             LIMIT 1
+            """
+        )
+        rows = cur.fetchall()
+        if rows:
+            cur.execute("UPDATE jobs SET status='working' WHERE id=?", (rows[0][0],))
+    con.commit()
+    return rows[0] if rows else None
+
+
+def _job_from_row(row: Any) -> dict[str, Any]:
+    """
+    Normalize a claimed (id, task, payload, key) row; payload JSON is parsed here, per job.
+    The claim query CASTs task/payload to BLOB, so both arrive as bytes or None whatever
+    their storage class (no per-row type dispatch, no shared text_factory change).
+    """
+    # positional unpack: column order is fixed by the claim query, no by-name Row lookups
+    jid, raw_task, raw_payload, key = row
+
+    task_name = (raw_task or b"").decode("utf-8", errors="ignore").strip() or "unknown"
+
+    # Normalize payload (JSON stored in 'payload' column); both decoders take bytes as-is
+    payload: dict[str, Any] = {}
+    if raw_payload:
+        with suppress(Exception):
+            parsed = _json_loads(raw_payload)
+            payload = parsed if isinstance(parsed, dict) else {"raw": parsed}
+
+    task_obj = {"task": task_name, "payload": payload}
+    return {"id": int(jid), "task": task_obj, "key": key}
+
+
+def _try_patch_pop(*, import_missing: bool = True) -> bool:
     """
     Try to import services.queue.worker_entry and patch _db_pop_one.
     Returns True if patched, False if worker_entry or _connect not ready yet.
+    With import_missing=False only already-imported modules are considered.
     """
     try:
-        we = importlib.import_module("services.queue.worker_entry")
+        we = _cached_import("services.queue.worker_entry", import_missing=import_missing)
     except Exception as e:
         log.info("sitecustomize: worker_entry not ready yet: %r", e)
         return False
@@ -118,61 +258,20 @@ def _try_patch_pop() -> bool:
         log.info("sitecustomize: worker_entry._connect not available yet")
         return False
 
+    # share worker_entry's persistent per-thread connection when it has one
+    get_con = getattr(we, "_con", None)
+    reset_con = getattr(we, "_reset_con", None)
+    if not (callable(get_con) and callable(reset_con)):
+        get_con, reset_con = functools.partial(_thread_con, _connect), _reset_thread_con
+
     # Define the fixed version
     def _db_pop_one_fixed() -> dict[str, Any] | None:
-        con = _connect()
-        cur = con.cursor()
         try:
-            cur.execute("BEGIN IMMEDIATE")
-            cur.execute(
-                """
-                SELECT id, task, payload, key
-                  FROM jobs
-                 WHERE status='queued'
-                 ORDER BY id ASC
-                 LIMIT 1
-                """
-            )
-            row = cur.fetchone()
-            if not row:
-                con.commit()
-                return None
-
-            jid = int(row["id"])
-            cur.execute("UPDATE jobs SET status='working' WHERE id=?", (jid,))
-            con.commit()
-
-            # Normalize task name
-            task_name: Any = row["task"]
-            if isinstance(task_name, (bytes, bytearray)):
-                task_name = task_name.decode("utf-8", errors="ignore")
-            if not isinstance(task_name, str):
-                task_name = str(task_name or "")
-            task_name = task_name.strip() or "unknown"
-
-            # Normalize payload (JSON stored in 'payload' column)
-            raw_payload: Any = row["payload"]
-            if isinstance(raw_payload, (bytes, bytearray)):
-                raw_payload = raw_payload.decode("utf-8", errors="ignore")
-
-            payload: dict[str, Any] = {}
-            if isinstance(raw_payload, str):
-                with suppress(Exception):
-                    parsed = json.loads(raw_payload)
-                    if isinstance(parsed, dict):
-                        payload = parsed
-                    else:
-                        payload = {"raw": parsed}
-            elif isinstance(raw_payload, dict):
-                payload = raw_payload
-            elif raw_payload is not None:
-                payload = {"raw": raw_payload}
-
-            task_obj = {"task": task_name, "payload": payload}
-            return {"id": jid, "task": task_obj, "key": row["key"]}
-        finally:
-            with suppress(Exception):
-                con.close()
+            row = _claim_one(get_con())
+        except sqlite3.Error:
+            reset_con()
+            raise
+        return _job_from_row(row) if row is not None else None
 
     # Install the patch idempotently
     setattr(we, "_db_pop_one", _db_pop_one_fixed)
@@ -180,19 +279,40 @@ def _try_patch_pop() -> bool:
     return True
 
 
-def _ensure_patch_with_retry() -> None:
-    """Patch immediately; if not possible, retry a few times in the background."""
-    if _try_patch_pop():
-        return
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    """
+    One-shot meta-path hook: when services.queue.worker_entry is imported later,
+    wrap its loader so the pop patch is applied right after the module body runs.
+    Never supplies a spec of its own; it only decorates the one the next finder returns.
+    """
+
+    target = "services.queue.worker_entry"
 
-    def _retry():
-        for _ in range(50):  # ~5 seconds total
-            if _try_patch_pop():
-                return
-            time.sleep(0.1)
-        log.warning("sitecustomize: gave up patching worker_entry._db_pop_one")
+    def find_spec(self, fullname: str, path: Any, target: Any = None) -> Any:
+        if fullname != self.target:
+            return None
+        with suppress(ValueError):
+            sys.meta_path.remove(self)
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        loader = getattr(spec, "loader", None)
+        exec_module = getattr(loader, "exec_module", None)
+        if exec_module is None:
+            return spec
 
-    threading.Thread(target=_retry, name="sitecustomize-pop-patch", daemon=True).start()
+        def _exec_then_patch(module: Any) -> None:
+            exec_module(module)
+            if not _try_patch_pop(import_missing=False):
+                log.warning("sitecustomize: could not patch worker_entry._db_pop_one")
+
+        loader.exec_module = _exec_then_patch  # type: ignore[union-attr]
+        return spec
+
+
+def _ensure_patch_on_import() -> None:
+    """Patch immediately; if worker_entry cannot be imported yet, patch when it is."""
+    if _try_patch_pop():
+        return
+    sys.meta_path.insert(0, _PatchOnImport())
 
 
 # ------------------------------------------------------------------------------
@@ -204,6 +324,6 @@ except Exception:
     log.exception("sitecustomize: _install_local_handlers failed")
 
 try:
-    _ensure_patch_with_retry()
+    _ensure_patch_on_import()
 except Exception:
-    log.exception("sitecustomize: _ensure_patch_with_retry failed")
+    log.exception("sitecustomize: _ensure_patch_on_import failed")
@@ -1,39 +1,35 @@
 # orchestrator/router_client.py
 from __future__ import annotations
 
+from collections.abc import Callable
 from typing import Any
 
+_GREET_SRC = "def greet(name: str) -> str:\n" '    return f"Hello, {name}!"\n'
+
+
+def _route_plan(name: str, pl: dict) -> dict:
+    module = str(pl.get("module") or "hello_mod").replace("-", "_")
+    path = f"generated/{module}.py"
+    return {
+        "ok": True,
+        "policy": {"allowed": True, "rules_triggered": [], "notes": "Allowed"},
+        "model": {"name": "mini-phi"},
+        "next": {"task": "codegen", "payload": {"path": path, "content": _GREET_SRC}},
+    }
 
-def route(arg: Any, payload: dict | None = None) -> dict:
-    # allow both: route("task", payload) and route({"task":..., "payload":...})
-    if isinstance(arg, dict):
-        name = str(arg.get("task", ""))
-        pl = arg.get("payload") or {}
-    else:
-        name = str(arg or "")
-        pl = payload or {}
 
-    # --- simple pipeline ---
-    if name == "plan":
-        module = str(pl.get("module") or "hello_mod").replace("-", "_")
-        path = f"generated/{module}.py"
-        content = "def greet(name: str) -> str:\n" '    return f"Hello, {name}!"\n'
-        return {
-            "ok": True,
-            "policy": {"allowed": True, "rules_triggered": [], "notes": "Allowed"},
-            "model": {"name": "mini-phi"},
-            "next": {"task": "codegen", "payload": {"path": path, "content": content}},
-        }
-
-    if name == "codegen":
-        path = pl.get("path") or "generated/hello_mod.py"
-        content = pl.get("content") or "print('hello')\n"
-        return {"ok": True, "file": {"path": path, "content": content}}
-
-    if name == "pytest":
-        # worker will actually run pytest; this is just a placeholder
-        return {"ok": True, "note": "pytest will be executed by worker"}
+def _route_codegen(name: str, pl: dict) -> dict:
+    path = pl.get("path") or "generated/hello_mod.py"
+    content = pl.get("content") or "print('hello')\n"
+    return {"ok": True, "file": {"path": path, "content": content}}
 
+
+def _route_pytest(name: str, pl: dict) -> dict:
+    # worker will actually run pytest; this is just a placeholder
+    return {"ok": True, "note": "pytest will be executed by worker"}
+
+
+def _route_default(name: str, pl: dict) -> dict:
     # default fallback mirrors your earlier behavior
     return {
         "ok": True,
@@ -45,3 +41,22 @@ def route(arg: Any, payload: dict | None = None) -> dict:
             "message": "",
         },
     }
+
+
+# --- simple pipeline: one dict lookup per call instead of an if-chain ---
+_ROUTES: dict[str, Callable[[str, dict], dict]] = {
+    "plan": _route_plan,
+    "codegen": _route_codegen,
+    "pytest": _route_pytest,
+}
+
+
+def route(arg: Any, payload: dict | None = None) -> dict:
+    # allow both: route("task", payload) and route({"task":..., "payload":...})
+    if isinstance(arg, dict):
+        name = str(arg.get("task", ""))
+        pl = arg.get("payload") or {}
+    else:
+        name = str(arg or "")
+        pl = payload or {}
+    return _ROUTES.get(name, _route_default)(name, pl)
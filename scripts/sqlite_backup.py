@@ -3,7 +3,6 @@ from __future__ import annotations
 
 import contextlib
 import datetime as dt
-import glob
 import os
 import pathlib
 import shutil
@@ -16,6 +15,8 @@ SRC = os.getenv("TASK_DB", "/data/jobs.db")
 DST_DIR = "/data/backups"
 RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "14"))
 INTERVAL = int(os.getenv("BACKUP_INTERVAL_SECONDS", str(24 * 60 * 60)))  # 24h default
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.05
 
 pathlib.Path(DST_DIR).mkdir(parents=True, exist_ok=True)
 
@@ -24,6 +25,23 @@ def _timestamp() -> str:
     return dt.datetime.now().strftime("%Y%m%d-%H%M%S")
 
 
+def _open_source() -> sqlite3.Connection:
+    """
+    Open SRC read-only, so the snapshot never takes a write lock on the live queue.
+    A WAL database cannot be opened with mode=ro when its -shm file is missing or the
+    directory is not writable; fall back to a normal connection in that case.
+    """
+    src_uri = f"{pathlib.Path(SRC).resolve().as_uri()}?mode=ro"
+    src = sqlite3.connect(src_uri, uri=True)
+    try:
+        # connect is lazy: the first read is what actually opens the WAL index
+        src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+    except sqlite3.OperationalError:
+        src.close()
+        src = sqlite3.connect(SRC)
+    return src
+
+
 def backup_once() -> str:
     """Online-safe snapshot using sqlite backup + atomic rename."""
     ts = _timestamp()
@@ -33,10 +51,12 @@ def backup_once() -> str:
         tmp_path = tmp.name
 
     try:
-        with sqlite3.connect(SRC) as src, sqlite3.connect(tmp_path) as dst:
+        with _open_source() as src, sqlite3.connect(tmp_path) as dst:
+            src.execute("PRAGMA busy_timeout=5000;")
             dst.execute("PRAGMA journal_mode=WAL;")
             dst.execute("PRAGMA synchronous=NORMAL;")
-            src.backup(dst)
+            # copy in page batches so the worker's writes can interleave with the snapshot
+            src.backup(dst, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP)
 
         # preserve metadata (mtime will reflect source)
         with contextlib.suppress(Exception):
@@ -53,10 +73,13 @@ def backup_once() -> str:
 def prune_old() -> None:
     """Delete snapshots older than RETENTION_DAYS by mtime."""
     cutoff = time.time() - (RETENTION_DAYS * 86400)
-    for f in glob.glob(os.path.join(DST_DIR, "jobs-*.db")):
-        with contextlib.suppress(Exception):
-            if os.path.getmtime(f) < cutoff:
-                pathlib.Path(f).unlink(missing_ok=True)
+    with os.scandir(DST_DIR) as entries:
+        for entry in entries:
+            if not (entry.name.startswith("jobs-") and entry.name.endswith(".db")):
+                continue
+            with contextlib.suppress(Exception):
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
 
 
 def main() -> None:
@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
+# usage: submit_task.py [task [payload_json [task payload_json ...]]]
 import json
 import os
 import sys
-import urllib.request
+
+import httpx
 
 HOST = os.getenv("HOST", "http://127.0.0.1:8000")
-task = sys.argv[1] if len(sys.argv) > 1 else "plan"
-payload = json.loads(sys.argv[2]) if len(sys.argv) > 2 else {"demo": 1}
+args = sys.argv[1:] or ["plan"]
+jobs = [
+    (args[i], json.loads(args[i + 1]) if i + 1 < len(args) else {"demo": 1})
+    for i in range(0, len(args), 2)
+]
 
-req = urllib.request.Request(
-    f"{HOST}/tasks",
-    data=json.dumps({"task": task, "payload": payload}).encode(),
-    headers={"content-type": "application/json"},
-)
-with urllib.request.urlopen(req) as r:
-    print(r.read().decode())
+# one keep-alive client: several submissions share a single connection
+with httpx.Client(base_url=HOST) as client:
+    for task, payload in jobs:
+        r = client.post("/tasks", json={"task": task, "payload": payload})
+        r.raise_for_status()
+        print(r.text)
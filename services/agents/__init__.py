@@ -1,6 +1,8 @@
 # services/agents/__init__.py
 from __future__ import annotations
 
+import functools
+import sys
 from collections.abc import Callable
 from typing import Any
 
@@ -17,8 +19,23 @@ HANDLERS: dict[str, Handler] = {
 }
 
 
+@functools.lru_cache(maxsize=256)
+def task_key(name: str) -> str:
+    """Canonical (stripped, lower-case, interned) handler key for a task name."""
+    return sys.intern((name or "").strip().lower())
+
+
+def register(name: str, fn: Handler) -> None:
+    """Register (or override) a handler under its canonical key."""
+    key = task_key(name)
+    if not key:
+        raise ValueError("handler name cannot be empty")
+    HANDLERS[key] = fn
+
+
 def get_handler(name: str) -> Handler:
-    try:
-        return HANDLERS[name]
-    except KeyError as e:
-        raise KeyError(f"unknown task: {name}") from e
+    # exact hit first: names coming off the queue are normally already canonical
+    handler = HANDLERS.get(name) or HANDLERS.get(task_key(name))
+    if handler is None:
+        raise KeyError(f"unknown task: {name}")
+    return handler
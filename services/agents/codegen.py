@@ -4,6 +4,34 @@ from typing import Any
 
 SAFE_LANGS: set[str] = {"python", "bash", "javascript", "typescript"}
 
+# module-level %-templates: one C-level substitution per call instead of rebuilding f-strings
+_PYTHON_TEMPLATE = (
+    '"""Auto-generated: %(spec)s"""\n'
+    "def main():\n"
+    '    print("hello from codegen: %(spec)s")\n'
+    "\n"
+    'if __name__ == "__main__":\n'
+    "    main()\n"
+)
+_BASH_TEMPLATE = (
+    "#!/usr/bin/env bash\n" "# Auto-generated: %(spec)s\n" 'echo "hello from codegen: %(spec)s"\n'
+)
+_JS_TEMPLATE = (
+    "// Auto-generated: %(spec)s\n"
+    "export function main() {\n"
+    '  console.log("hello from codegen: %(spec)s");\n'
+    "}\n"
+    'if (typeof require !== "undefined" && require.main === module) {\n'
+    "  main();\n"
+    "}\n"
+)
+_TEMPLATES: dict[str, str] = {
+    "python": _PYTHON_TEMPLATE,
+    "bash": _BASH_TEMPLATE,
+    "javascript": _JS_TEMPLATE,
+    "typescript": _JS_TEMPLATE,
+}
+
 
 def handle(_name: str, payload: dict[str, Any]) -> dict[str, Any]:
     """Deterministic local code generator (scaffold/boilerplate)."""
@@ -13,30 +41,5 @@ def handle(_name: str, payload: dict[str, Any]) -> dict[str, Any]:
     if lang not in SAFE_LANGS:
         return {"ok": False, "error": f"unsupported lang: {lang}", "data": {}}
 
-    if lang == "python":
-        code = (
-            f'"""Auto-generated: {spec}"""\n'
-            "def main():\n"
-            f'    print("hello from codegen: {spec}")\n'
-            "\n"
-            'if __name__ == "__main__":\n'
-            "    main()\n"
-        )
-    elif lang == "bash":
-        code = (
-            "#!/usr/bin/env bash\n"
-            f"# Auto-generated: {spec}\n"
-            f'echo "hello from codegen: {spec}"\n'
-        )
-    else:  # javascript / typescript
-        code = (
-            f"// Auto-generated: {spec}\n"
-            "export function main() {\n"
-            f'  console.log("hello from codegen: {spec}");\n'
-            "}\n"
-            'if (typeof require !== "undefined" && require.main === module) {\n'
-            "  main();\n"
-            "}\n"
-        )
-
+    code = _TEMPLATES[lang] % {"spec": spec}
     return {"ok": True, "artifact": {"language": lang, "code": code}}
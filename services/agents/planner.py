@@ -3,26 +3,25 @@ from __future__ import annotations
 
 from typing import Any
 
+_DEMO_STEPS = (
+    "analyze requirements",
+    "propose approach",
+    "execute minimal POC",
+    "report metrics",
+)
+_DEFAULT_STEPS = ("collect inputs", "draft plan", "review", "finalize")
+
 
 def handle(task_name: str, payload: dict[str, Any]) -> dict[str, Any]:
     """
     Minimal 'plan' agent: echoes a simple plan based on the payload.
     """
-    steps: list[str] = []
-
-    if payload.get("demo"):
-        steps = [
-            "analyze requirements",
-            "propose approach",
-            "execute minimal POC",
-            "report metrics",
-        ]
-    else:
-        steps = ["collect inputs", "draft plan", "review", "finalize"]
+    steps = _DEMO_STEPS if payload.get("demo") else _DEFAULT_STEPS
 
     return {
         "agent": "planner",
         "task": task_name,
-        "steps": steps,
+        # results are JSON-serialized and may be mutated by callers: hand out a list copy
+        "steps": list(steps),
         "inputs": payload,
     }
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import functools
 import os
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from services.app_server.middleware import pick_headers
+
+_RATE_HEADERS = frozenset((b"x-api-key", b"x-forwarded-for"))
 
 
 def _keys() -> dict[str, str]:
@@ -12,8 +16,14 @@ def _keys() -> dict[str, str]:
     Parse API_KEYS env var like:
       API_KEYS="k1:dev,k2:ops,k3"
     -> {"k1":"dev","k2":"ops","k3":"default"}
+    Parsed once per distinct value (see _parse_keys); treat the result as read-only.
     """
-    raw = os.environ.get("API_KEYS", "").strip()
+    return _parse_keys(os.environ.get("API_KEYS", ""))
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_keys(raw: str) -> dict[str, str]:
+    raw = raw.strip()
     if not raw:
         return {}
     out: dict[str, str] = {}
@@ -21,8 +31,8 @@ def _keys() -> dict[str, str]:
         part = part.strip()
         if not part:
             continue
-        if ":" in part:
-            k, label = part.split(":", 1)
+        k, sep, label = part.partition(":")
+        if sep:
             out[k.strip()] = label.strip() or "default"
         else:
             out[part] = "default"
@@ -30,51 +40,65 @@ def _keys() -> dict[str, str]:
 
 
 def _need_auth(path: str, method: str) -> bool:
-    # Always allow health/ready
-    if path in ("/health", "/ready"):
-        return False
-    # Protect only POST /tasks
-    return method.upper() == "POST" and path.startswith("/tasks")
+    # Protect only POST /tasks (health/ready, preflight and all GETs pass straight through)
+    return method == "POST" and path.startswith("/tasks")
 
 
-def _rate_key_for_api_key(request: Request) -> tuple[str, str]:
+def _rate_key_for_api_key(scope: Scope, keys: dict[str, str]) -> tuple[str, str]:
     # Rate limit key + label. Prefer API key if present.
-    api_key = request.headers.get("x-api-key") or ""
-    keys = _keys()
-    if api_key and api_key in keys:
-        return (f"apk:{api_key[:6]}…", keys[api_key])
-
-    fwd = request.headers.get("x-forwarded-for")
-    host = (
-        fwd.split(",")[0].strip() if fwd else (request.client.host if request.client else "unknown")
-    )
+    hdrs = pick_headers(scope, _RATE_HEADERS)
+    api_key_b = hdrs.get(b"x-api-key")
+    fwd_b = hdrs.get(b"x-forwarded-for")
+
+    if api_key_b:
+        api_key = api_key_b.decode("latin-1")
+        label = keys.get(api_key)
+        if label is not None:
+            return (f"apk:{api_key[:6]}…", label)
+
+    client = scope.get("client")
+    if fwd_b:
+        host = fwd_b.decode("latin-1").split(",")[0].strip()
+    else:
+        host = client[0] if client else "unknown"
     return (f"ip:{host}", "ip")
 
 
-class ApiKeyRequiredMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Always allow CORS preflight + health/ready
-        if request.method == "OPTIONS" or request.url.path in ("/health", "/ready"):
-            return await call_next(request)
+class ApiKeyRequiredMiddleware:
+    """
+    Pure ASGI: raw headers are read from the scope and rate_bucket/rate_label are written to
+    scope["state"] (what `request.state` reads downstream), so no Request is built here.
+    """
 
-        # Set rate bucket early (used by limiter)
-        request.state.rate_bucket, request.state.rate_label = _rate_key_for_api_key(request)
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-        if not _need_auth(request.url.path, request.method):
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        keys = _keys()
+        # Cheapest test first: everything except POST /tasks skips header/key work.
+        # The limiter derives the same ip:/apk: bucket itself when state is unset.
+        if not _need_auth(scope["path"], scope["method"]):
+            await self.app(scope, receive, send)
+            return
 
         # If no keys configured, permissive mode
+        keys = _keys()
         if not keys:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+
+        # One header pass + one probe; the bucket already carries the key label
+        bucket, label = _rate_key_for_api_key(scope, keys)
+        state = scope.setdefault("state", {})
+        state["rate_bucket"], state["rate_label"] = bucket, label
 
-        provided = request.headers.get("x-api-key", "")
-        if provided not in keys:
-            # tests assert on this exact string:
-            return JSONResponse({"detail": "missing or invalid api key"}, status_code=401)
+        if bucket.startswith("apk:"):
+            await self.app(scope, receive, send)
+            return
 
-        # Good key — tag bucket with key label
-        request.state.rate_bucket = f"apk:{provided[:6]}…"
-        request.state.rate_label = keys[provided]
-        return await call_next(request)
+        # tests assert on this exact string:
+        response = JSONResponse({"detail": "missing or invalid api key"}, status_code=401)
+        await response(scope, receive, send)
@@ -1,25 +1,122 @@
 # services/app_server/main.py
 from __future__ import annotations
 
+import asyncio
+import atexit
 import contextlib
-import json
+import functools
 import os
+import queue
 import sqlite3
+import threading
 import time
 from collections import deque
+from concurrent.futures import Future
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, field_validator
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.app_server.middleware import RateBuckets, pick_headers
+from services.common import jsonutil
+
+
+class _DefaultResponse(JSONResponse):
+    """JSONResponse rendered through jsonutil (orjson when it can, stdlib otherwise)."""
+
+    def render(self, content: Any) -> bytes:
+        return jsonutil.dumps_bytes(content)
+
+
+class TaskIn(BaseModel):
+    """POST /tasks body; validated by pydantic-core instead of a generic dict."""
+
+    model_config = ConfigDict(extra="ignore")
+
+    task: str = ""
+    payload: Any = None
+
+    @field_validator("task", mode="before")
+    @classmethod
+    def _task_as_str(cls, v: Any) -> str:
+        # lenient like the old `item: dict` endpoint: str(item.get("task", "")) for any value
+        return v if isinstance(v, str) else str(v)
+
+
+# raw body -> TaskIn straight from JSON bytes in pydantic-core (no intermediate dict);
+# errors are re-raised as RequestValidationError so clients still get the usual 422
+_TASK_IN = TypeAdapter(TaskIn)
+_TASK_IN_LIST = TypeAdapter(list[TaskIn])
+
+
+def _body_schema(schema: dict[str, Any]) -> dict[str, Any]:
+    """openapi_extra for routes that decode their own body (keeps /docs accurate)."""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+
+async def _decode_body(
+    request: Request, adapter: TypeAdapter[Any], *, keep_raw: bool = False
+) -> tuple[Any, Any]:
+    """
+    Validate the JSON body with `adapter`; returns (validated, raw).
+    Without keep_raw, pydantic-core validates straight from the bytes and raw is None.
+    With it (TASK_LOG wants the body as sent), the bytes are decoded once and that one
+    object is both validated and returned.
+    """
+    body = await request.body()
+    try:
+        if not keep_raw:
+            return adapter.validate_json(body), None
+        try:
+            raw = jsonutil.loads(body)
+        except ValueError as e:  # json.JSONDecodeError, or undecodable bytes
+            error = {
+                "type": "json_invalid",
+                "loc": ("body", getattr(e, "pos", 0)),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": getattr(e, "msg", str(e))},
+            }
+            raise RequestValidationError([error], body=body) from None
+        return adapter.validate_python(raw), raw
+    except ValidationError as e:
+        errors = [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+        raise RequestValidationError(errors, body=body) from None
+
 
 # tiny in-memory ring buffer (used by GET /tasks in tests)
 _recent: deque[dict[str, Any]] = deque(maxlen=100)
+# encoded GET /tasks bodies per limit; valid until the next _remember_task
+_recent_bodies: dict[int, bytes] = {}
+_RECENT_BODIES_MAX = 32
+
+
+def _remember_task(job_id: int, task: str, payload: Any) -> None:
+    _recent.append({"id": job_id, "task": task, "payload": payload, "status": "queued"})
+    _recent_bodies.clear()
+
+
+def _recent_body(limit: int) -> bytes:
+    body = _recent_bodies.get(limit)
+    if body is None:
+        items = list(islice(reversed(_recent), limit))
+        body = jsonutil.dumps_bytes({"ok": True, "items": items})
+        if len(_recent_bodies) >= _RECENT_BODIES_MAX:
+            _recent_bodies.clear()
+        _recent_bodies[limit] = body
+    return body
 
 
+@functools.cache
 def _q():
-    # local queue backend
+    # local queue backend, imported once
     from services.queue import sqlite_queue as q
 
     return q
@@ -29,18 +126,19 @@ def _truthy(v: str | None) -> bool:
     return bool(v) and v.lower() not in {"0", "false", "no", ""}
 
 
-def _parse_api_keys(env: str | None) -> dict[str, str]:
-    # "k1:dev,k2:ops" -> {"k1": "dev", "k2": "ops"}
-    out: dict[str, str] = {}
+@functools.lru_cache(maxsize=4)
+def _parse_api_keys(env: str | None) -> frozenset[str]:
+    # "k1:dev,k2:ops" -> {"k1", "k2"}; labels are not used by this app
     if not env:
-        return out
+        return frozenset()
+    out: set[str] = set()
     for part in env.split(","):
-        if ":" in part:
-            k, v = part.split(":", 1)
+        k, sep, _label = part.partition(":")
+        if sep:
             k = k.strip()
             if k:
-                out[k] = v.strip()
-    return out
+                out.add(k)
+    return frozenset(out)
 
 
 def _rate_state() -> tuple[int, int]:
@@ -56,8 +154,244 @@ def _rate_state() -> tuple[int, int]:
     return req, win
 
 
+@functools.lru_cache(maxsize=8)
+def _task_log_path(raw: str) -> Path | None:
+    """
+    TASK_LOG -> Path, resolved once per distinct value.
+    Keyed on the raw env string (not frozen at create_app) so the module-level app
+    still follows TASK_LOG changes made after import.
+    """
+    raw = raw.strip()
+    return Path(raw) if raw else None
+
+
+# one append handle per TASK_LOG path, kept open across requests
+_log_lock = threading.Lock()
+_log_files: dict[Path, BinaryIO] = {}
+
+
+def _append_log_line(path: Path, line: bytes) -> None:
+    """Append one encoded JSONL line; the file is opened (and its dir created) once per path."""
+    with _log_lock:
+        fh = _log_files.get(path)
+        if fh is None or fh.closed:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # unbuffered: each record reaches the file in a single write
+            fh = _log_files[path] = open(path, "ab", buffering=0)  # noqa: SIM115
+        fh.write(line)
+
+
+@atexit.register
+def _close_log_files() -> None:
+    with _log_lock:
+        for fh in _log_files.values():
+            with contextlib.suppress(Exception):
+                fh.close()
+        _log_files.clear()
+
+
+def _max_request_bytes() -> int:
+    # 0 disables the payload-size guard
+    try:
+        return int(os.getenv("MAX_REQUEST_BYTES", "").strip() or 0)
+    except Exception:
+        return 0
+
+
+_GUARD_HEADERS = frozenset((b"x-api-key", b"content-length"))
+_GUARDED_PATHS = frozenset(("/tasks", "/tasks/batch"))
+
+
+class _AuthAndLimits:
+    """
+    Pure ASGI guard: api key, payload size and per-key rate window on POST /tasks[/batch].
+    Reads headers straight from the scope; no Request object or task hop per call.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        allowed_keys: frozenset[str],
+        max_bytes: int,
+        rate: tuple[int, int],
+    ) -> None:
+        self.app = app
+        self.allowed_keys = allowed_keys
+        self.max_bytes = max_bytes
+        self.req_limit, self.win_sec = rate
+        # per-key sliding window
+        self.buckets = RateBuckets()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        if scope["method"] == "POST" and path in _GUARDED_PATHS:
+            rejected = self._check(pick_headers(scope, _GUARD_HEADERS))
+            if rejected is None and self.max_bytes > 0:
+                receive, rejected = await self._read_capped(receive)
+            if rejected is not None:
+                await rejected(scope, receive, send)
+                return
+        elif path == "/health":
+            send = _with_server_header(send)
+        await self.app(scope, receive, send)
+
+    def _check(self, hdrs: dict[bytes, bytes]) -> JSONResponse | None:
+        # raw header bytes; decode only what we use
+        apikey_b = hdrs.get(b"x-api-key")
+        clen_b = hdrs.get(b"content-length")
+        apikey = apikey_b.decode("latin-1") if apikey_b is not None else None
+
+        # auth only on POST /tasks
+        if self.allowed_keys and (apikey or "") not in self.allowed_keys:
+            return JSONResponse(status_code=401, content={"detail": "missing or invalid api key"})
+
+        # payload-size guard
+        if self.max_bytes > 0:
+            try:
+                clen_i = int(clen_b) if clen_b else 0
+            except Exception:
+                clen_i = 0
+            if clen_i and clen_i > self.max_bytes:
+                return JSONResponse(status_code=413, content={"detail": "payload too large"})
+
+        # rate-limit
+        if self.req_limit and self.win_sec:
+            bucket = "anon" if apikey is None else apikey
+            now = time.time()
+            ring = self.buckets.window(bucket, self.req_limit)
+            if ring.full(now, self.win_sec):
+                return JSONResponse(status_code=429, content={"detail": "rate limit exceeded"})
+            ring.hit(now)
+        return None
+
+    async def _read_capped(self, receive: Receive) -> tuple[Receive, JSONResponse | None]:
+        """
+        Content-Length can be absent (chunked) or wrong: count the body as it arrives and
+        stop at the first chunk past max_bytes. Accepted messages are replayed downstream.
+        """
+        messages: list[Message] = []
+        total = 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break  # disconnect: pass it on
+            total += len(message.get("body", b""))
+            if total > self.max_bytes:
+                return receive, JSONResponse(
+                    status_code=413, content={"detail": "payload too large"}
+                )
+            if not message.get("more_body", False):
+                break
+
+        async def replay() -> Message:
+            return messages.pop(0) if messages else await receive()
+
+        return replay, None
+
+
+def _with_server_header(send: Send) -> Send:
+    # set a lowercase server header the tests look for
+    async def _send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            MutableHeaders(scope=message)["server"] = "velu"
+        await send(message)
+
+    return _send
+
+
+# (TASK_LOG path, encoded log lines, jobs, future resolved with the job ids)
+_WriteReq = tuple[Path | None, list[bytes], list[dict[str, Any]], Future[list[int]]]
+
+
+class _TaskWriter:
+    """
+    Single writer thread with group commit for POST /tasks[/batch].
+
+    Requests queue their TASK_LOG lines and jobs; the thread drains whatever is
+    pending (up to `max_batch` requests), appends the log lines and inserts every
+    job with one enqueue_many, i.e. one SQLite commit per drained batch.
+    """
+
+    def __init__(self, max_batch: int = 128) -> None:
+        self.max_batch = max_batch
+        self._pending: queue.SimpleQueue[_WriteReq] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(
+        self, log_path: Path | None, lines: list[bytes], jobs: list[dict[str, Any]]
+    ) -> Future[list[int]]:
+        fut: Future[list[int]] = Future()
+        self._pending.put((log_path, lines, jobs, fut))
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            with self._lock:
+                # (re)start: first use, or the previous thread died unexpectedly
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._run, name="velu-task-writer", daemon=True
+                    )
+                    self._thread.start()
+        return fut
+
+    def _run(self) -> None:
+        pending = self._pending
+        while True:
+            batch = [pending.get()]
+            with contextlib.suppress(queue.Empty):
+                while len(batch) < self.max_batch:
+                    batch.append(pending.get_nowait())
+            try:
+                self._flush(batch)
+            except BaseException as e:
+                # never leave a caller waiting: fail whatever this batch left unresolved
+                for *_rest, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(HTTPException(status_code=500, detail=str(e)))
+                if not isinstance(e, Exception):
+                    raise
+
+    def _flush(self, batch: list[_WriteReq]) -> None:
+        # log first (as before), per request: a failed append only fails its request
+        ready: list[_WriteReq] = []
+        for req in batch:
+            log_path, lines, _jobs, fut = req
+            if log_path is not None and lines:
+                try:
+                    _append_log_line(log_path, b"".join(lines))
+                except Exception as e:
+                    fut.set_exception(e)
+                    continue
+            ready.append(req)
+        if not ready:
+            return
+        try:
+            ids = _q().enqueue_many([job for _lp, _ls, jobs, _f in ready for job in jobs])
+        except Exception:
+            # the batch is one transaction, so nothing was inserted; redo it per request
+            # so only the request that actually fails gets the error
+            for _lp, _ls, jobs, fut in ready:
+                try:
+                    fut.set_result(_q().enqueue_many(jobs))
+                except Exception as e:
+                    fut.set_exception(HTTPException(status_code=500, detail=str(e)))
+            return
+        pos = 0
+        for _lp, _ls, jobs, fut in ready:
+            fut.set_result(ids[pos : pos + len(jobs)])
+            pos += len(jobs)
+
+
+_writer = _TaskWriter()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="VELU API", version="1.0.0")
+    app = FastAPI(title="VELU API", version="1.0.0", default_response_class=_DefaultResponse)
 
     # basic CORS for tests
     app.add_middleware(
@@ -67,76 +401,48 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
-    # per-key sliding window
-    _buckets: dict[str, deque[float]] = {}
-
-    @app.middleware("http")
-    async def auth_and_limits(request: Request, call_next):
-        # auth only on POST /tasks
-        if request.method == "POST" and request.url.path == "/tasks":
-            keys = _parse_api_keys(os.getenv("API_KEYS"))
-            if keys:
-                apikey = request.headers.get("X-API-Key", "")
-                if apikey not in keys:
-                    return JSONResponse(
-                        status_code=401,
-                        content={"detail": "missing or invalid api key"},
-                    )
-            # payload-size guard
-            max_bytes_env = os.getenv("MAX_REQUEST_BYTES", "").strip()
-            if max_bytes_env:
-                try:
-                    max_bytes = int(max_bytes_env)
-                except Exception:
-                    max_bytes = 0
-                if max_bytes > 0:
-                    clen = request.headers.get("content-length")
-                    try:
-                        clen_i = int(clen) if clen else 0
-                    except Exception:
-                        clen_i = 0
-                    if clen_i and clen_i > max_bytes:
-                        return JSONResponse(
-                            status_code=413, content={"detail": "payload too large"}
-                        )
-
-            # rate-limit
-            req_limit, win_sec = _rate_state()
-            if req_limit and win_sec:
-                apikey = request.headers.get("X-API-Key", "anon")
-                now = time.time()
-                dq = _buckets.setdefault(apikey, deque())
-                # drop old
-                while dq and now - dq[0] > win_sec:
-                    dq.popleft()
-                if len(dq) >= req_limit:
-                    return JSONResponse(status_code=429, content={"detail": "rate limit exceeded"})
-                dq.append(now)
-
-        response = await call_next(request)
-        # set a lowercase server header the tests look for
-        if request.url.path == "/health":
-            response.headers["server"] = "velu"
-        return response
+    # auth/limit settings are resolved once per app, not re-parsed on every request
+    app.add_middleware(
+        _AuthAndLimits,
+        allowed_keys=_parse_api_keys(os.getenv("API_KEYS")),
+        max_bytes=_max_request_bytes(),
+        rate=_rate_state(),
+    )
 
     @app.get("/health")
     def health():
         # Body must include "app": "velu"; tests also check a lowercase Server header.
         return JSONResponse({"ok": True, "app": "velu"}, headers={"server": "velu"})
 
+    ready_db = os.environ.get("TASK_DB") or str(Path.cwd() / "data" / "pointers" / "tasks.db")
+    # create the db dir once here; a missing dir later surfaces as not-ready
+    with contextlib.suppress(OSError):
+        Path(ready_db).parent.mkdir(parents=True, exist_ok=True)
+    # last successful probe (monotonic ts, body); readiness polls within the TTL reuse it
+    ready_ttl = 1.0
+    ready_lock = threading.Lock()
+    ready_cache: tuple[float, dict[str, Any]] | None = None
+
     @app.get("/ready")
     def ready():
-        db = os.environ.get("TASK_DB") or str(Path.cwd() / "data" / "pointers" / "tasks.db")
-        try:
-            Path(db).parent.mkdir(parents=True, exist_ok=True)
-            con = sqlite3.connect(db)
-            cur = con.cursor()
-            with contextlib.suppress(Exception):
-                cur.execute("SELECT 1")
-            con.close()
-            return {"ok": True, "db": {"path": db, "reachable": True}}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e)) from e
+        nonlocal ready_cache
+        db = ready_db
+        with ready_lock:
+            cached = ready_cache
+            if cached is not None and time.monotonic() - cached[0] < ready_ttl:
+                return cached[1]
+            try:
+                con = sqlite3.connect(db)
+                cur = con.cursor()
+                with contextlib.suppress(Exception):
+                    cur.execute("SELECT 1")
+                con.close()
+            except Exception as e:
+                ready_cache = None
+                raise HTTPException(status_code=500, detail=str(e)) from e
+            body = {"ok": True, "db": {"path": db, "reachable": True}}
+            ready_cache = (time.monotonic(), body)
+            return body
 
     @app.post("/route/preview")
     def route_preview(item: dict):
@@ -151,32 +457,47 @@ def create_app() -> FastAPI:
         }
 
     @app.get("/tasks")
-    def list_tasks(limit: int = 10):
-        items = list(_recent)[-limit:][::-1]
-        return {"ok": True, "items": items}
-
-    @app.post("/tasks")
-    def post_task(item: dict, request: Request):
-        payload = item.get("payload") or {}
-        task = str(item.get("task", "")).strip() or "plan"
-
-        # log if requested
-        log_path = os.getenv("TASK_LOG", "").strip()
-        if log_path:
-            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
-
-        # enqueue
-        try:
-            job_id = _q().enqueue(task=task, payload=payload, priority=0)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e)) from e
+    async def list_tasks(limit: int = 10):
+        # in-memory only; no reason to hop to the threadpool. Repeat reads between
+        # appends get the already-encoded body.
+        return Response(_recent_body(max(limit, 0)), media_type="application/json")
+
+    task_schema = _TASK_IN.json_schema()
+
+    @app.post("/tasks", openapi_extra=_body_schema(task_schema))
+    async def post_task(request: Request):
+        # TASK_LOG gets the object exactly as the client sent it (unknown keys too)
+        log_path = _task_log_path(os.environ.get("TASK_LOG", ""))
+        item, raw = await _decode_body(request, _TASK_IN, keep_raw=log_path is not None)
+        payload = item.payload or {}
+        task = item.task.strip() or "plan"
+
+        # handed to the group-commit writer thread; SQLite takes one writer at a time
+        job = {"task": task, "payload": payload, "priority": 0}
+        lines = [jsonutil.dumps_line(raw)] if log_path is not None else []
+        (job_id,) = await asyncio.wrap_future(_writer.submit(log_path, lines, [job]))
 
         # keep a small in-memory copy
-        _recent.append({"id": job_id, "task": task, "payload": payload, "status": "queued"})
+        _remember_task(job_id, task, payload)
         return {"ok": True, "job_id": job_id, "received": {"task": task, "payload": payload}}
 
+    @app.post("/tasks/batch", openapi_extra=_body_schema({"type": "array", "items": task_schema}))
+    async def post_tasks_batch(request: Request):
+        log_path = _task_log_path(os.environ.get("TASK_LOG", ""))
+        items, raw = await _decode_body(request, _TASK_IN_LIST, keep_raw=log_path is not None)
+        jobs = [
+            {"task": it.task.strip() or "plan", "payload": it.payload or {}, "priority": 0}
+            for it in items
+        ]
+        # one line per element, same order as jobs (raw is the list they were validated from)
+        lines = [jsonutil.dumps_line(obj) for obj in raw] if log_path is not None else []
+
+        job_ids = await asyncio.wrap_future(_writer.submit(log_path, lines, jobs))
+
+        for job_id, job in zip(job_ids, jobs, strict=True):
+            _remember_task(job_id, job["task"], job["payload"])
+        return {"ok": True, "job_ids": job_ids}
+
     @app.get("/results/{job_id}")
     def get_result(job_id: int):
         try:
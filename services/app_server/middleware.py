@@ -1,29 +1,120 @@
 # services/app_server/middleware.py
 import os
 import time
-from collections import deque
+from array import array
+from collections import OrderedDict
 
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import Scope
+
+
+def pick_headers(scope: Scope, names: frozenset[bytes]) -> dict[bytes, bytes]:
+    """
+    One pass over the raw ASGI header pairs (names are lowercase bytes), keeping only
+    `names`. First occurrence wins, like Headers.get; values stay undecoded.
+    """
+    out: dict[bytes, bytes] = {}
+    for k, v in scope["headers"]:
+        if k in names and k not in out:
+            out[k] = v
+    return out
+
+
+_RATE_HEADERS = frozenset((b"x-api-key", b"x-forwarded-for"))
+_BODY_HEADERS = frozenset((b"content-length",))
 
 
 class BodySizeLimitMiddleware(BaseHTTPMiddleware):
-    def _max_bytes(self) -> int:
-        return int(os.environ.get("MAX_REQUEST_BYTES", "1048576"))
+    def __init__(self, app):
+        super().__init__(app)
+        # read once; env changes need a new app, like the rest of the settings
+        self.max_bytes = int(os.environ.get("MAX_REQUEST_BYTES", "1048576"))
 
     async def dispatch(self, request: Request, call_next):
         if request.method in ("POST", "PUT", "PATCH"):
-            # read and re-inject the body with a size check
-            body = await request.body()
-            if len(body) > self._max_bytes():
-                return JSONResponse({"detail": "payload too large"}, status_code=413)
+            too_large = JSONResponse({"detail": "payload too large"}, status_code=413)
+            # declared size over the cap: reject before reading anything
+            clen = pick_headers(request.scope, _BODY_HEADERS).get(b"content-length")
+            if clen:
+                try:
+                    if int(clen) > self.max_bytes:
+                        return too_large
+                except ValueError:
+                    pass
+
+            # stream with a running total; stop at the first chunk past the cap
+            chunks: list[bytes] = []
+            total = 0
+            async for chunk in request.stream():
+                total += len(chunk)
+                if total > self.max_bytes:
+                    return too_large
+                chunks.append(chunk)
+            # same cache request.body() fills; call_next replays it downstream
+            request._body = b"".join(chunks)
+            return await call_next(request)
+        return await call_next(request)
 
-            async def receive():
-                return {"type": "http.request", "body": body, "more_body": False}
 
-            return await call_next(Request(scope=request.scope, receive=receive))
-        return await call_next(request)
+class RateWindow:
+    """
+    Sliding-window hit log for one bucket: a fixed ring of the last `limit` timestamps.
+    Only the slot about to be overwritten (the oldest hit) is examined per check.
+    """
+
+    __slots__ = ("_ts", "_head", "_count")
+
+    def __init__(self, limit: int) -> None:
+        self._ts = array("d", bytes(8 * max(limit, 0)))
+        self._head = 0
+        self._count = 0
+
+    @property
+    def limit(self) -> int:
+        return len(self._ts)
+
+    def full(self, now: float, window: float) -> bool:
+        """True if `limit` hits already fall within `window` seconds of `now`."""
+        n = len(self._ts)
+        if n == 0:
+            return True
+        return self._count == n and now - self._ts[self._head] <= window
+
+    def hit(self, now: float) -> None:
+        n = len(self._ts)
+        if n == 0:
+            return
+        self._ts[self._head] = now
+        self._head = (self._head + 1) % n
+        if self._count < n:
+            self._count += 1
+
+
+class RateBuckets:
+    """
+    key -> RateWindow, bounded: once `max_keys` buckets exist, the least recently
+    used one is dropped, so one-off clients/IPs don't accumulate forever.
+    """
+
+    def __init__(self, max_keys: int = 10_000) -> None:
+        self.max_keys = max(1, max_keys)
+        self._windows: OrderedDict[str, RateWindow] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def window(self, key: str, limit: int) -> RateWindow:
+        """The bucket's window (created, or recreated if `limit` changed), marked as used."""
+        windows = self._windows
+        ring = windows.get(key)
+        if ring is None or ring.limit != limit:
+            ring = windows[key] = RateWindow(limit)
+            if len(windows) > self.max_keys:
+                windows.popitem(last=False)
+        windows.move_to_end(key)
+        return ring
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
@@ -42,44 +133,38 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 
     def __init__(self, app):
         super().__init__(app)
-        self.hits: dict[str, deque[float]] = {}
+        self.hits = RateBuckets()
+        # allowed, window_seconds — read once per middleware instance
+        self.allowed = int(os.environ.get("RATE_REQUESTS", "60"))
+        self.window = int(os.environ.get("RATE_WINDOW_SEC", "60"))
 
     def _bucket_for(self, request: Request) -> str:
+        hdrs = pick_headers(request.scope, _RATE_HEADERS)
+
         # Prefer explicit API key header (guarantees per-key isolation)
-        hdr_key = request.headers.get("x-api-key")
+        hdr_key = hdrs.get(b"x-api-key")
         if hdr_key:
-            return f"apk:{hdr_key}"
+            return f"apk:{hdr_key.decode('latin-1')}"
 
         # Otherwise prefer bucket set by auth middleware (if any)
         if hasattr(request.state, "rate_bucket") and request.state.rate_bucket:
             return request.state.rate_bucket
 
         # Fallback to client IP
-        fwd = request.headers.get("x-forwarded-for")
+        fwd = hdrs.get(b"x-forwarded-for")
         if fwd:
-            return f"ip:{fwd.split(',')[0].strip()}"
+            return f"ip:{fwd.decode('latin-1').split(',')[0].strip()}"
         return f"ip:{request.client.host if request.client else 'unknown'}"
 
-    def _limits(self) -> tuple[int, int]:
-        # allowed, window_seconds
-        return (
-            int(os.environ.get("RATE_REQUESTS", "60")),
-            int(os.environ.get("RATE_WINDOW_SEC", "60")),
-        )
-
     async def dispatch(self, request: Request, call_next):
         bucket = self._bucket_for(request)
-        allowed, window = self._limits()
+        allowed, window = self.allowed, self.window
 
         now = time.time()
-        dq = self.hits.setdefault(bucket, deque())
-
-        # purge old hits
-        while dq and (now - dq[0]) > window:
-            dq.popleft()
+        ring = self.hits.window(bucket, allowed)
 
         # PRE-CHECK: already at or over quota?
-        if len(dq) >= allowed:
+        if ring.full(now, window):
             return JSONResponse({"detail": "rate limit exceeded"}, status_code=429)
 
         # Run downstream
@@ -90,10 +175,5 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             return response
 
         # Record this authorized request
-        t = time.time()
-        dq.append(t)
-        # purge again (strictness)
-        while dq and (t - dq[0]) > window:
-            dq.popleft()
-
+        ring.hit(time.time())
         return response
@@ -1,13 +1,17 @@
 # services/app_server/store.py
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import sqlite3
+import threading
 import time
-from collections import deque
 from collections.abc import Iterable
-from typing import Any
+from contextlib import suppress
+from typing import Any, BinaryIO
+
+from services.common import jsonutil
 
 # --- path helpers ------------------------------------------------------------
 
@@ -53,18 +57,79 @@ def _resolve_paths() -> tuple[str, str]:
 
 # --- file logging (human + jsonl) -------------------------------------------
 
+# one append handle per path, opened (and its dir created) on first use
+_fh_lock = threading.Lock()
+_fhs: dict[str, BinaryIO] = {}
+
+
+def _append_lines(items: Iterable[tuple[str, bytes]]) -> None:
+    """Write each (path, encoded line) pair through the cached handle for that path."""
+    touched: list[BinaryIO] = []
+    with _fh_lock:
+        for path, line in items:
+            fh = _fhs.get(path)
+            if fh is None or fh.closed:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                fh = _fhs[path] = open(path, "ab")  # noqa: SIM115
+            fh.write(line)
+            touched.append(fh)
+        # one flush per file per task, after all lines are buffered
+        for fh in touched:
+            fh.flush()
+
+
+@atexit.register
+def _close_files() -> None:
+    with _fh_lock:
+        for fh in _fhs.values():
+            with suppress(Exception):
+                fh.close()
+        _fhs.clear()
+
+
+def _jsonl_line(task: dict[str, Any]) -> bytes:
+    record = dict(task)
+    record.setdefault("ts", time.time())
+    return jsonutil.dumps_line(record)
+
 
 def _append_jsonl(task: dict[str, Any]) -> None:
     _, jsonl_path = _resolve_paths()
-    os.makedirs(os.path.dirname(jsonl_path) or ".", exist_ok=True)
-    record = dict(task)
-    record.setdefault("ts", time.time())
-    with open(jsonl_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    _append_lines(((jsonl_path, _jsonl_line(task)),))
 
 
 # --- sqlite compatibility insert --------------------------------------------
 
+_INSERT_WITH_TS = "INSERT INTO tasks(task, payload, ts) VALUES(?,?,?)"
+_INSERT_NO_TS = "INSERT INTO tasks(task, payload) VALUES(?,?)"
+
+_tls = threading.local()
+# INSERT statement per db path, picked from the tasks-table schema on first use
+# (only cached once the table exists; dropped again if the insert stops matching)
+_insert_sql: dict[str, str] = {}
+
+
+def _db_conn(db_path: str) -> sqlite3.Connection:
+    # per-thread connection, reopened only when the db path changes
+    con = getattr(_tls, "con", None)
+    if con is None or getattr(_tls, "path", None) != db_path:
+        if con is not None:
+            con.close()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        con = sqlite3.connect(db_path)
+        _tls.con, _tls.path = con, db_path
+    return con
+
+
+def _pick_insert(con: sqlite3.Connection, db_path: str) -> str | None:
+    sql = _insert_sql.get(db_path)
+    if sql is None:
+        cols = {r[1] for r in con.execute("PRAGMA table_info(tasks)")}
+        if not cols:
+            return None
+        sql = _insert_sql[db_path] = _INSERT_WITH_TS if "ts" in cols else _INSERT_NO_TS
+    return sql
+
 
 def _insert_db_row(task: dict[str, Any]) -> None:
     """
@@ -75,41 +140,43 @@ def _insert_db_row(task: dict[str, Any]) -> None:
     We never create the table here; we insert only if it already exists.
     """
     db_path = _db_path()
-    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    # stdlib json on purpose: the compat test matches its `"key": value` spacing
     payload_json = json.dumps(task.get("payload", {}))
+    task_name = task.get("task", "")
 
+    con = _db_conn(db_path)
     # Use context manager so we always commit properly
-    with sqlite3.connect(db_path) as con:
-        con.row_factory = sqlite3.Row
-        cols = {r["name"] for r in con.execute("PRAGMA table_info(tasks)")}
-        if not cols:
-            # Table doesn't exist in this DB; silently skip (matches test expectations)
-            return
-
-        if "ts" in cols:
-            ts_val = int(time.time())
-            con.execute(
-                "INSERT INTO tasks(task, payload, ts) VALUES(?,?,?)",
-                (task.get("task", ""), payload_json, ts_val),
-            )
-        else:
-            con.execute(
-                "INSERT INTO tasks(task, payload) VALUES(?,?)",
-                (task.get("task", ""), payload_json),
+    with con:
+        for _attempt in range(2):
+            sql = _pick_insert(con, db_path)
+            if sql is None:
+                # Table doesn't exist in this DB; silently skip (matches test expectations)
+                return
+            params = (
+                (task_name, payload_json, int(time.time()))
+                if sql is _INSERT_WITH_TS
+                else (task_name, payload_json)
             )
+            try:
+                con.execute(sql, params)
+                break
+            except (sqlite3.OperationalError, sqlite3.IntegrityError):
+                # schema changed under the cached statement (e.g. ts added): re-probe once
+                if _insert_sql.pop(db_path, None) is None or _attempt:
+                    raise
         # implicit commit on successful exit
 
 
 def append_task(task: dict[str, Any]) -> None:
-    log_path, _ = _resolve_paths()
-    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    log_path, jsonl_path = _resolve_paths()
 
-    # human-readable line log
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(task, ensure_ascii=False) + "\n")
-
-    # structured jsonl
-    _append_jsonl(task)
+    # human-readable line log + structured jsonl, one locked pass
+    _append_lines(
+        (
+            (log_path, jsonutil.dumps_line(task)),
+            (jsonl_path, _jsonl_line(task)),
+        )
+    )
 
     # optional sqlite insert (only if tasks table already exists)
     _insert_db_row(task)
@@ -118,24 +185,57 @@ def append_task(task: dict[str, Any]) -> None:
 # --- reads -------------------------------------------------------------------
 
 
-def _tail_lines(path: str, limit: int) -> Iterable[str]:
-    if not os.path.exists(path):
+_TAIL_BLOCK = 64 * 1024
+
+
+def _tail_lines(path: str, limit: int) -> list[str]:
+    """
+    Last `limit` non-empty lines of `path`, newest first.
+
+    Reads backwards from EOF in growing blocks, so the cost depends on `limit`,
+    not on how large the log has become.
+    """
+    limit = max(1, limit)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
         return []
-    dq: deque[str] = deque(maxlen=max(1, limit))
-    with open(path, encoding="utf-8") as f:
-        for line in f:
-            dq.append(line.rstrip("\n"))
-    return list(dq)
+    try:
+        pos = os.fstat(fd).st_size
+        block = max(_TAIL_BLOCK, limit * 512)
+        buf = b""
+        lines: list[bytes] = []
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            buf = os.pread(fd, step, pos) + buf
+            lines = buf.split(b"\n")
+            if pos > 0:
+                # the first chunk may start mid-line
+                lines = lines[1:]
+            # blank lines are skipped, so count only the ones that will be kept
+            if sum(1 for raw in lines if raw) >= limit:
+                break
+            block *= 2
+    finally:
+        os.close(fd)
+
+    out: list[str] = []
+    for raw in reversed(lines):
+        if raw:
+            out.append(raw.decode("utf-8", errors="replace"))
+            if len(out) >= limit:
+                break
+    return out
 
 
 def recent_tasks(limit: int = 100) -> list[dict[str, Any]]:
     _, jsonl_path = _resolve_paths()
     out: list[dict[str, Any]] = []
+    # newest-first for tests that expect latest insert at index 0
     for line in _tail_lines(jsonl_path, limit):
         try:
-            out.append(json.loads(line))
-        except json.JSONDecodeError:
+            out.append(jsonutil.loads(line))
+        except ValueError:
             continue
-    # newest-first for tests that expect latest insert at index 0
-    out.reverse()
     return out
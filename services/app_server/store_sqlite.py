@@ -1,17 +1,34 @@
 import os
 import sqlite3
+import threading
 import time
 from collections.abc import Iterable
 from typing import Any
 
+from services.common import jsonutil
+
 
 def db_path() -> str:
     return os.environ.get("TASK_DB", "data/pointers/tasks.db")
 
 
-def _conn():
-    os.makedirs(os.path.dirname(db_path()), exist_ok=True)
-    return sqlite3.connect(db_path())
+_tls = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    # Per-thread connection for the current db path, opened (and tuned) once.
+    # Callers use `with _conn() as cx:` for commit/rollback; the connection stays open.
+    path = db_path()
+    con = getattr(_tls, "con", None)
+    if con is None or getattr(_tls, "path", None) != path:
+        if con is not None:
+            con.close()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        con = sqlite3.connect(path, cached_statements=512)
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA synchronous=NORMAL;")
+        _tls.con, _tls.path = con, path
+    return con
 
 
 def init_db():
@@ -30,23 +47,19 @@ def init_db():
 
 
 def insert(task: dict[str, Any]) -> None:
-    import json
-
     with _conn() as cx:
         cx.execute(
             "INSERT INTO tasks (ts, task, payload) VALUES (?, ?, ?)",
             (
                 time.time(),
                 task["task"],
-                json.dumps(task["payload"], ensure_ascii=False),
+                jsonutil.dumps(task["payload"]),
             ),
         )
         cx.commit()
 
 
 def list_recent(limit: int = 50) -> Iterable[dict[str, Any]]:
-    import json
-
     with _conn() as cx:
         rows = cx.execute(
             "SELECT id, ts, task, payload FROM tasks ORDER BY id DESC LIMIT ?",
@@ -54,5 +67,5 @@ def list_recent(limit: int = 50) -> Iterable[dict[str, Any]]:
         ).fetchall()
     out: list[dict[str, Any]] = []
     for rid, ts, task, payload in rows:
-        out.append({"id": rid, "ts": ts, "task": task, "payload": json.loads(payload)})
+        out.append({"id": rid, "ts": ts, "task": task, "payload": jsonutil.loads(payload)})
     return out
@@ -0,0 +1,68 @@
+# services/common/jsonutil.py
+from __future__ import annotations
+
+import json
+from typing import Any
+
+# optional fast JSON: orjson emits utf-8 bytes directly; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# orjson decodes ints past 64 bits to the nearest float instead of raising
+_INT64_LIMIT = 2**63
+
+
+def _lost_int(obj: Any) -> bool:
+    """True if orjson turned an out-of-range int into a float somewhere in `obj`."""
+    stack = [obj]
+    while stack:
+        v = stack.pop()
+        t = type(v)
+        if t is float:
+            if abs(v) >= _INT64_LIMIT and v.is_integer():
+                return True
+        elif t is dict:
+            stack.extend(v.values())
+        elif t is list:
+            stack.extend(v)
+    return False
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    """json.loads, through orjson when installed; exact for ints of any size."""
+    if orjson is not None:
+        try:
+            obj = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN/Infinity, which stdlib json accepts
+        else:
+            if not _lost_int(obj):
+                return obj
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact UTF-8 JSON; non-str dict keys are stringified like stdlib json does."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits; stdlib json handles those
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """dumps_bytes() as str, for TEXT columns."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def dumps_line(obj: Any) -> bytes:
+    """dumps_bytes() plus a trailing newline: one JSONL record."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -1,14 +1,18 @@
 # services/queue/sqlite_queue.py
 from __future__ import annotations
 
-import json
+import atexit
 import os
 import random
 import sqlite3
+import threading
 import time
-from contextlib import contextmanager
+from collections.abc import Iterable, Sequence
+from contextlib import contextmanager, suppress
 from typing import Any
 
+from services.common import jsonutil
+
 
 def _int_env(name: str, default: int) -> int:
     try:
@@ -66,28 +70,89 @@ def _migrate(con: sqlite3.Connection) -> None:
     for col, ddl in _OPTIONAL_COLS.items():
         if col not in cols:
             _safe_add_column(con, col, ddl)
+    # partial index over queued rows only (done/error rows stay out of it), in dequeue
+    # order; next_run_at/status make it covering for the ready pick
     con.execute(
-        "CREATE INDEX IF NOT EXISTS idx_jobs_ready " "ON jobs(status, next_run_at, priority, id)"
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queued_ready "
+        "ON jobs(priority DESC, id, next_run_at, status) WHERE status='queued'"
     )
+    con.execute("DROP INDEX IF EXISTS idx_jobs_ready")
+
+
+def _open(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=512)
+    con.row_factory = sqlite3.Row
+    try:
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA synchronous=NORMAL;")
+        con.execute("PRAGMA foreign_keys=ON;")
+        con.execute("PRAGMA temp_store=MEMORY;")
+        con.execute("PRAGMA mmap_size=268435456;")  # 256 MiB read mapping
+    except sqlite3.OperationalError:
+        pass
+    _migrate(con)
+    con.commit()
+    return con
+
+
+# per-thread connections keyed by db path; pragmas + migration run once per open
+_tls = threading.local()
+_MAX_CONNS_PER_THREAD = 4
+_all_conns: list[sqlite3.Connection] = []
+_all_lock = threading.Lock()
+
+
+def _thread_conns() -> dict[str, sqlite3.Connection]:
+    conns: dict[str, sqlite3.Connection] | None = getattr(_tls, "conns", None)
+    if conns is None:
+        conns = _tls.conns = {}
+    return conns
+
+
+def _drop(conns: dict[str, sqlite3.Connection], path: str) -> None:
+    con = conns.pop(path, None)
+    if con is None:
+        return
+    with _all_lock, suppress(ValueError):
+        _all_conns.remove(con)
+    with suppress(Exception):
+        con.close()
 
 
 @contextmanager
 def _conn():
+    """
+    Yield this thread's persistent connection for the current db path.
+    Any open transaction is rolled back on error; the connection stays cached.
+    """
     path = _db_path()
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    con = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conns = _thread_conns()
+    con = conns.get(path)
+    if con is None:
+        if len(conns) >= _MAX_CONNS_PER_THREAD:
+            _drop(conns, next(iter(conns)))
+        con = conns[path] = _open(path)
+        with _all_lock:
+            _all_conns.append(con)
     try:
-        try:
-            con.execute("PRAGMA journal_mode=WAL;")
-            con.execute("PRAGMA synchronous=NORMAL;")
-            con.execute("PRAGMA foreign_keys=ON;")
-        except sqlite3.OperationalError:
-            pass
-        _migrate(con)
-        con.commit()
         yield con
-    finally:
-        con.close()
+    except BaseException:
+        if con.in_transaction:
+            try:
+                con.rollback()
+            except sqlite3.Error:
+                _drop(conns, path)
+        raise
+
+
+@atexit.register
+def _close_all() -> None:
+    with _all_lock:
+        for con in _all_conns:
+            with suppress(Exception):
+                con.close()
+        _all_conns.clear()
 
 
 def init() -> None:
@@ -95,43 +160,129 @@ def init() -> None:
         pass
 
 
-def _now() -> int:
-    return int(time.time())
+# set after every committed enqueue; lets a worker in the same process (e.g. the API's
+# embedded worker) pick a new job up immediately instead of waiting out its poll sleep
+_wake = threading.Event()
 
 
-def _json_dumps(value: Any) -> str:
-    return json.dumps(value, ensure_ascii=False)
+def wait_for_work(timeout: float) -> bool:
+    """
+    Block until a job is enqueued from this process or `timeout` seconds pass.
+    Returns True if woken by an enqueue. Jobs from other processes and delayed
+    retries are still only seen on timeout, so keep `timeout` at the poll interval.
+    """
+    woke = _wake.wait(timeout)
+    _wake.clear()
+    return woke
+
+
+def _now() -> int:
+    return int(time.time())
 
 
 def _json_loads_maybe(s: str | None) -> Any:
     if not s:
         return None
     try:
-        return json.loads(s)
+        return jsonutil.loads(s)
     except Exception:
         return s
 
 
 def _normalize_result_for_storage(result: Any) -> str:
-    if isinstance(result, (bytes, bytearray)):
-        result = result.decode("utf-8", errors="replace")
-    if isinstance(result, str):
+    if isinstance(result, (str, bytes, bytearray)):
+        # validate as-is (the loader takes utf-8 bytes); valid JSON is stored verbatim
         try:
-            json.loads(result)
-            return result
+            jsonutil.loads(result)
         except Exception:
-            return _json_dumps({"ok": True, "data": result})
-    return _json_dumps(result)
+            if not isinstance(result, str):
+                result = result.decode("utf-8", errors="replace")
+            return jsonutil.dumps({"ok": True, "data": result})
+        return result if isinstance(result, str) else result.decode("utf-8", errors="replace")
+    return jsonutil.dumps(result)
+
+
+# base * 2**attempts for every attempt count fail() can reach
+_DELAY_TABLE = tuple(max(1, SQLQ_RETRY_BASE_SEC) << i for i in range(max(1, SQLQ_MAX_ATTEMPTS) + 2))
 
 
 def _next_delay(attempts: int) -> int:
     exp = max(0, attempts)
-    base = max(1, SQLQ_RETRY_BASE_SEC)
-    delay = base * (2**exp)
-    jitter = random.uniform(0, 0.25 * delay)  # nosec B311
+    n = len(_DELAY_TABLE)
+    delay = _DELAY_TABLE[exp] if exp < n else max(1, SQLQ_RETRY_BASE_SEC) << exp
+    # jitter in [0, 0.25 * delay)
+    jitter = delay * random.getrandbits(8) / 1024  # nosec B311
     return int(delay + jitter)
 
 
+# --- statements ---------------------------------------------------------------
+# module constants so each call reuses the connection's prepared-statement cache
+
+_INSERT_JOB = """
+    INSERT INTO jobs(task, payload, status, priority, next_run_at, attempts)
+    VALUES(?,?,?,?,?,?)
+"""
+_SELECT_READY = """
+    SELECT id FROM jobs
+    WHERE status='queued'
+      AND (next_run_at IS NULL OR next_run_at <= ?)
+    ORDER BY priority DESC, id
+    LIMIT 1
+"""
+_MARK_IN_PROGRESS = "UPDATE jobs SET status='in_progress' WHERE id=? AND status='queued'"
+# SQLite >= 3.35: _SELECT_READY + _MARK_IN_PROGRESS as a single statement
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_CLAIM_READY = f"""
+    UPDATE jobs SET status='in_progress'
+     WHERE id = ({_SELECT_READY})
+       AND status='queued'
+    RETURNING id
+"""  # nosec B608 - constant SQL, no user input
+_JOB_COLS = "id, task, payload, status, result, attempts, priority, next_run_at, last_error"
+_SELECT_JOB = f"SELECT {_JOB_COLS} FROM jobs WHERE id=?"  # nosec B608 - constant
+_SELECT_ATTEMPTS = "SELECT attempts FROM jobs WHERE id=?"
+_SELECT_RECENT = f"SELECT {_JOB_COLS} FROM jobs ORDER BY id DESC LIMIT ?"  # nosec B608
+_MARK_DONE = """
+    UPDATE jobs
+       SET status='done',
+           result=?,
+           next_run_at=NULL
+     WHERE id=?
+"""
+_MARK_ERROR = """
+    UPDATE jobs
+       SET status='error',
+           result=?,
+           attempts=?,
+           last_error=?,
+           next_run_at=NULL
+     WHERE id=?
+"""
+_MARK_RETRY = """
+    UPDATE jobs
+       SET status='queued',
+           attempts=?,
+           last_error=?,
+           next_run_at=?
+     WHERE id=?
+"""
+
+
+def _job_row(
+    task: str, payload: Any, priority: int, not_before: int | None
+) -> tuple[str, str, str, int, int | None, int]:
+    if not task:
+        raise ValueError("enqueue: 'task' must be provided")
+    return (
+        task,
+        jsonutil.dumps(payload or {}),
+        "queued",
+        int(priority),
+        int(not_before) if not_before else None,
+        0,
+    )
+
+
 def enqueue(
     item: Any = None,
     *,
@@ -142,55 +293,71 @@ def enqueue(
     not_before: int | None = None,
 ) -> int:
     if isinstance(item, dict) and task is None and payload is None:
-        task = str(item.get("task", ""))
-        payload = item.get("payload") or {}
+        row = _job_row(str(item.get("task", "")), item.get("payload"), priority, not_before)
     else:
-        task = str(task or "")
-        payload = payload or {}
-    if not task:
-        raise ValueError("enqueue: 'task' must be provided")
-    payload_json = _json_dumps(payload)
+        row = _job_row(str(task or ""), payload, priority, not_before)
     with _conn() as con:
-        cur = con.execute(
-            """
-            INSERT INTO jobs(task, payload, status, priority, next_run_at, attempts)
-            VALUES(?,?,?,?,?,?)
-            """,
-            (
-                task,
-                payload_json,
-                "queued",
-                int(priority),
-                int(not_before) if not_before else None,
-                0,
-            ),
+        cur = con.execute(_INSERT_JOB, row)
+        con.commit()
+    _wake.set()
+    return int(cur.lastrowid)
+
+
+def enqueue_many(items: Iterable[dict[str, Any]]) -> list[int]:
+    """
+    Insert several jobs in one transaction (a single commit for the whole batch).
+    Each item is {"task", "payload"?, "priority"?, "not_before"?}; returns ids in order.
+    Nothing is inserted if any item is invalid.
+    """
+    rows = [
+        _job_row(
+            str(it.get("task", "")),
+            it.get("payload"),
+            it.get("priority") or 0,
+            it.get("not_before"),
         )
+        for it in items
+    ]
+    if not rows:
+        return []
+    with _conn() as con:
+        ids = [int(con.execute(_INSERT_JOB, row).lastrowid) for row in rows]
         con.commit()
-        return int(cur.lastrowid)
+    _wake.set()
+    return ids
+
 
+def _done_rows(finished: Iterable[tuple[int, Any]]) -> list[tuple[str, int]]:
+    # encode everything before a transaction is opened, so a bad result writes nothing
+    return [(_normalize_result_for_storage(result), int(jid)) for jid, result in finished]
 
-def dequeue() -> int | None:
+
+def dequeue(finished: Iterable[tuple[int, Any]] = ()) -> int | None:
+    """
+    Claim the next ready job and return its id (None when nothing is ready).
+    `finished` takes (job_id, result) pairs of jobs the caller has completed; they are
+    marked done in the same transaction as the claim, so a worker loop pays one commit
+    per job and a result is visible before the next job is even loaded.
+    """
+    done = _done_rows(finished)
+    now = _now()
     with _conn() as con:
-        con.execute("BEGIN IMMEDIATE")
-        now = _now()
-        row = con.execute(
-            """
-            SELECT id FROM jobs
-            WHERE status='queued'
-              AND (next_run_at IS NULL OR next_run_at <= ?)
-            ORDER BY priority DESC, id
-            LIMIT 1
-            """,
-            (now,),
-        ).fetchone()
+        if done:
+            con.executemany(_MARK_DONE, done)
+        if _HAS_RETURNING:
+            # pick + claim in one atomic statement
+            row = con.execute(_CLAIM_READY, (now,)).fetchone()
+            con.commit()
+            return int(row[0]) if row else None
+
+        if not con.in_transaction:
+            con.execute("BEGIN IMMEDIATE")
+        row = con.execute(_SELECT_READY, (now,)).fetchone()
         if not row:
             con.execute("COMMIT")
             return None
         job_id = int(row[0])
-        updated = con.execute(
-            "UPDATE jobs SET status='in_progress' WHERE id=? AND status='queued'",
-            (job_id,),
-        )
+        updated = con.execute(_MARK_IN_PROGRESS, (job_id,))
         if updated.rowcount == 0:
             con.execute("COMMIT")
             return None
@@ -198,100 +365,55 @@ def dequeue() -> int | None:
         return job_id
 
 
+def _job_dict(row: Sequence[Any]) -> dict[str, Any]:
+    # positional unpack of a _JOB_COLS row; _migrate guarantees every column exists
+    rid, task, payload, status, result, attempts, priority, next_run_at, last_error = row
+    return {
+        "id": rid,
+        "task": task,
+        "payload": _json_loads_maybe(payload) or {},
+        "status": status,
+        "result": _json_loads_maybe(result),
+        "attempts": attempts or 0,
+        "priority": priority or 0,
+        "next_run_at": next_run_at,
+        "last_error": last_error,
+    }
+
+
 def load(job_id: int) -> dict[str, Any]:
     with _conn() as con:
-        con.row_factory = sqlite3.Row
-        row = con.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        row = con.execute(_SELECT_JOB, (job_id,)).fetchone()
     if not row:
         return {}
-    keys = row.keys()
-    return {
-        "id": row["id"],
-        "task": row["task"],
-        "payload": _json_loads_maybe(row["payload"]) or {},
-        "status": row["status"],
-        "result": _json_loads_maybe(row["result"]),
-        "attempts": row["attempts"] if "attempts" in keys else 0,
-        "priority": row["priority"] if "priority" in keys else 0,
-        "next_run_at": row["next_run_at"] if "next_run_at" in keys else None,
-        "last_error": row["last_error"] if "last_error" in keys else None,
-    }
+    return _job_dict(row)
 
 
 def finish(job_id: int, result: Any) -> None:
     with _conn() as con:
         result_json = _normalize_result_for_storage(result)
-        con.execute(
-            """
-            UPDATE jobs
-               SET status='done',
-                   result=?,
-                   next_run_at=NULL
-             WHERE id=?
-            """,
-            (result_json, job_id),
-        )
+        con.execute(_MARK_DONE, (result_json, job_id))
         con.commit()
 
 
 def fail(job_id: int, message: str) -> None:
     with _conn() as con:
-        con.row_factory = sqlite3.Row
-        row = con.execute("SELECT attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+        row = con.execute(_SELECT_ATTEMPTS, (job_id,)).fetchone()
         attempts = int(row["attempts"]) if row else 0
         new_attempts = attempts + 1
         terminal = new_attempts >= max(1, SQLQ_MAX_ATTEMPTS)
         err_payload = {"ok": False, "error": str(message), "attempts": new_attempts}
         if terminal:
             con.execute(
-                """
-                UPDATE jobs
-                   SET status='error',
-                       result=?,
-                       attempts=?,
-                       last_error=?,
-                       next_run_at=NULL
-                 WHERE id=?
-                """,
-                (_json_dumps(err_payload), new_attempts, str(message), job_id),
+                _MARK_ERROR, (jsonutil.dumps(err_payload), new_attempts, str(message), job_id)
             )
         else:
             delay = _next_delay(attempts)
-            con.execute(
-                """
-                UPDATE jobs
-                   SET status='queued',
-                       attempts=?,
-                       last_error=?,
-                       next_run_at=?
-                 WHERE id=?
-                """,
-                (new_attempts, str(message), _now() + delay, job_id),
-            )
+            con.execute(_MARK_RETRY, (new_attempts, str(message), _now() + delay, job_id))
         con.commit()
 
 
 def list_recent(limit: int = 50) -> list[dict[str, Any]]:
     with _conn() as con:
-        con.row_factory = sqlite3.Row
-        rows = con.execute(
-            "SELECT * FROM jobs ORDER BY id DESC LIMIT ?",
-            (max(1, limit),),
-        ).fetchall()
-    out: list[dict[str, Any]] = []
-    for r in rows:
-        keys = r.keys()
-        out.append(
-            {
-                "id": r["id"],
-                "task": r["task"],
-                "payload": _json_loads_maybe(r["payload"]) or {},
-                "status": r["status"],
-                "result": _json_loads_maybe(r["result"]),
-                "attempts": r["attempts"] if "attempts" in keys else 0,
-                "priority": r["priority"] if "priority" in keys else 0,
-                "next_run_at": r["next_run_at"] if "next_run_at" in keys else None,
-                "last_error": r["last_error"] if "last_error" in keys else None,
-            }
-        )
-    return out
+        rows = con.execute(_SELECT_RECENT, (max(1, limit),)).fetchall()
+    return [_job_dict(r) for r in rows]
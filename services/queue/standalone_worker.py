@@ -1,12 +1,16 @@
 # services/queue/standalone_worker.py
-import json
 import os
 import sqlite3
 import time
-from contextlib import closing
+from contextlib import closing, suppress
+
+from services.common import jsonutil
 
 DB_PATH = os.environ.get("TASK_DB", "/data/jobs.db")
 
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS jobs (
     id       INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -20,50 +24,82 @@ CREATE TABLE IF NOT EXISTS jobs (
 """
 
 
+# hot statements as constants: the connection's statement cache keys on the exact text
+_CLAIM_ONE_RETURNING = """
+UPDATE jobs SET status='running'
+ WHERE id = (SELECT id FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1)
+RETURNING id, task
+"""
+_CLAIM_ONE_SELECT = "SELECT id, task FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1"
+_CLAIM_ONE_UPDATE = "UPDATE jobs SET status='running' WHERE id=? AND status='queued'"
+_COMPLETE_JOB = "UPDATE jobs SET status=?, result=?, err=? WHERE id=?"
+
+
+def _connect() -> sqlite3.Connection:
+    # autocommit; multi-statement work uses explicit BEGIN IMMEDIATE / COMMIT
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=256)
+    # same pragma set as worker_entry._connect
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA mmap_size=268435456;")  # 256 MiB read mapping
+    return conn
+
+
 def ensure_schema():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with closing(_connect()) as conn:
+        # WAL is persistent in the db file, so switching once at startup is enough
+        conn.execute("PRAGMA journal_mode=WAL;")
         conn.execute(SCHEMA)
-        conn.commit()
+        # partial index: claims only ever look at queued rows, so done/error rows stay
+        # out of it (same index worker_entry._connect creates)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(id) WHERE status='queued'")
+        conn.execute("PRAGMA optimize;")
 
 
-def claim_one_job(conn: sqlite3.Connection):
+def claim_one_job(conn: sqlite3.Connection, completed: tuple | None = None):
     """
     Atomically claim one queued job by flipping status -> running.
+    `completed` is the _completion() row of the job just processed; it is written in the
+    same IMMEDIATE transaction, so finishing one job and claiming the next is one commit.
     Returns (id, task_json) or None if none found.
     """
     conn.isolation_level = None  # manual transactions
     conn.execute("BEGIN IMMEDIATE")
-    cur = conn.execute("SELECT id, task FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1")
-    row = cur.fetchone()
-    if not row:
-        conn.execute("COMMIT")
-        return None
-    job_id, task_json = row
-    # claim if still queued
-    cur = conn.execute(
-        "UPDATE jobs SET status='running' WHERE id=? AND status='queued'",
-        (job_id,),
-    )
-    if cur.rowcount != 1:
+    try:
+        if completed is not None:
+            conn.execute(_COMPLETE_JOB, completed)
+        if _HAS_RETURNING:
+            # pick + flip in one statement; BEGIN IMMEDIATE already holds the write lock
+            rows = conn.execute(_CLAIM_ONE_RETURNING).fetchall()
+        else:
+            rows = conn.execute(_CLAIM_ONE_SELECT).fetchall()
+            # claim if still queued
+            if rows and conn.execute(_CLAIM_ONE_UPDATE, (rows[0][0],)).rowcount != 1:
+                rows = []
+    except BaseException:
         conn.execute("ROLLBACK")
-        return None
+        raise
     conn.execute("COMMIT")
-    return job_id, task_json
+    return (rows[0][0], rows[0][1]) if rows else None
+
+
+def _completion(job_id: int, result: dict | None, err: dict | None) -> tuple:
+    """Bind parameters for _COMPLETE_JOB."""
+    return (
+        "done" if err is None else "error",
+        jsonutil.dumps(result) if result is not None else None,
+        jsonutil.dumps(err) if err is not None else None,
+        job_id,
+    )
 
 
 def complete_job(
     conn: sqlite3.Connection, job_id: int, result: dict | None, err: dict | None = None
 ):
-    conn.execute(
-        "UPDATE jobs SET status=?, result=?, err=? WHERE id=?",
-        (
-            "done" if err is None else "error",
-            json.dumps(result) if result is not None else None,
-            json.dumps(err) if err is not None else None,
-            job_id,
-        ),
-    )
-    conn.commit()
+    conn.execute(_COMPLETE_JOB, _completion(job_id, result, err))
+    if conn.in_transaction:
+        conn.commit()
 
 
 def process_task(task_obj: dict) -> dict:
@@ -87,23 +123,37 @@ def process_task(task_obj: dict) -> dict:
 def main():
     ensure_schema()
     print(f"worker: connected to {DB_PATH}", flush=True)
+    # one connection for the life of the worker; reopened only after an OperationalError
+    conn: sqlite3.Connection | None = None
+    # each job's completion rides along with the next claim's transaction
+    pending: tuple | None = None
     while True:
-        with closing(sqlite3.connect(DB_PATH)) as conn:
+        if conn is None:
+            conn = _connect()
             conn.row_factory = sqlite3.Row
-            claimed = claim_one_job(conn)
-            if not claimed:
-                time.sleep(0.5)
-                continue
-
-            job_id, task_json = claimed
-            try:
-                task_obj = json.loads(task_json) if isinstance(task_json, str) else task_json
-                result = process_task(task_obj)
-                complete_job(conn, job_id, result, None)
-                print(f"worker: done {job_id}", flush=True)
-            except Exception as e:
-                complete_job(conn, job_id, None, {"error": str(e)})
-                print(f"worker: error {job_id}: {e}", flush=True)
+        try:
+            claimed = claim_one_job(conn, pending)
+        except sqlite3.OperationalError as e:
+            print(f"worker: claim failed: {e}", flush=True)
+            with suppress(Exception):
+                conn.close()
+            conn = None
+            time.sleep(0.5)
+            continue
+        pending = None
+        if not claimed:
+            time.sleep(0.5)
+            continue
+
+        job_id, task_json = claimed
+        try:
+            task_obj = jsonutil.loads(task_json) if isinstance(task_json, str) else task_json
+            pending = _completion(job_id, process_task(task_obj), None)
+            msg = f"worker: done {job_id}"
+        except Exception as e:
+            pending = _completion(job_id, None, {"error": str(e)})
+            msg = f"worker: error {job_id}: {e}"
+        print(msg, flush=True)
 
 
 if __name__ == "__main__":
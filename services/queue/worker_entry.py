@@ -1,96 +1,140 @@
 from __future__ import annotations
 
-import json
 import os
 import sqlite3
+import threading
 import time
 from collections.abc import Callable
 from contextlib import suppress
 from typing import Any
 
-from services.agents import HANDLERS  # plan/analyze/execute/report handlers
+from services.agents import HANDLERS, task_key  # plan/analyze/execute/report handlers
+from services.common import jsonutil
+from services.worker.log import worker_logger
 
 DB_PATH = os.getenv("TASK_DB", "/data/jobs.db")
 
+# idle polling: start fast, back off while the queue stays empty
+IDLE_SLEEP_MIN_SEC = 0.25
+IDLE_SLEEP_MAX_SEC = 2.0
+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+# hot statements as constants: the connection's statement cache keys on the exact text
+_CLAIM_RETURNING = """
+UPDATE jobs
+   SET status='working'
+ WHERE id = (SELECT id FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1)
+RETURNING id, task, key
+"""
+_CLAIM_SELECT = "SELECT id, task, key FROM jobs WHERE status='queued' ORDER BY id ASC LIMIT 1"
+_CLAIM_MARK = "UPDATE jobs SET status='working' WHERE id=?"
+_MARK_DONE = "UPDATE jobs SET status=?, result=?, err=? WHERE id=?"
+
 
 def _connect() -> sqlite3.Connection:
-    con = sqlite3.connect(DB_PATH)
+    con = sqlite3.connect(DB_PATH, cached_statements=256)
     con.row_factory = sqlite3.Row
     # Keep worker resilient under load
     con.execute("PRAGMA busy_timeout=5000;")
     con.execute("PRAGMA journal_mode=WAL;")
     con.execute("PRAGMA synchronous=NORMAL;")
+    con.execute("PRAGMA temp_store=MEMORY;")
+    con.execute("PRAGMA mmap_size=268435456;")  # 256 MiB read mapping
+    # partial index: the claim query only ever looks at queued rows
+    with suppress(sqlite3.OperationalError):
+        con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(id) WHERE status='queued'")
     return con
 
 
-def _db_pop_one() -> dict[str, Any] | None:
-    """Atomically claim one queued job as 'working'. Returns dict or None."""
-    con = _connect()
-    cur = con.cursor()
-    try:
-        cur.execute("BEGIN IMMEDIATE")
-        cur.execute(
-            """
-            SELECT id, task, key
-              FROM jobs
-             WHERE status='queued'
-             ORDER BY id ASC
-             LIMIT 1
-            """
-        )
-        row = cur.fetchone()
-        if not row:
-            con.commit()
-            return None
+_tls = threading.local()
 
-        jid = int(row["id"])
-        cur.execute("UPDATE jobs SET status='working' WHERE id=?", (jid,))
-        con.commit()
 
-        task_obj: Any = row["task"]
-        if isinstance(task_obj, bytes | bytearray):
-            task_obj = task_obj.decode("utf-8", errors="ignore")
-        if isinstance(task_obj, str):
-            with suppress(Exception):
-                task_obj = json.loads(task_obj)
+def _con() -> sqlite3.Connection:
+    """Per-thread persistent connection; pragmas run once when it is opened."""
+    con: sqlite3.Connection | None = getattr(_tls, "con", None)
+    if con is None:
+        con = _tls.con = _connect()
+    return con
 
-        if not isinstance(task_obj, dict):
-            task_obj = {"task": "unknown", "payload": {"raw": task_obj}}
 
-        return {"id": jid, "task": task_obj, "key": row["key"]}
-    finally:
+def _reset_con() -> None:
+    """Drop (and roll back) this thread's connection; the next call reopens it."""
+    con = getattr(_tls, "con", None)
+    _tls.con = None
+    if con is not None:
         with suppress(Exception):
             con.close()
 
 
+def _claim_one(con: sqlite3.Connection) -> sqlite3.Row | None:
+    """Flip the oldest queued row to 'working' in one IMMEDIATE transaction."""
+    cur = con.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    if _HAS_RETURNING:
+        cur.execute(_CLAIM_RETURNING)
+        rows = cur.fetchall()
+    else:
+        cur.execute(_CLAIM_SELECT)
+        rows = cur.fetchall()
+        if rows:
+            cur.execute(_CLAIM_MARK, (rows[0]["id"],))
+    con.commit()
+    return rows[0] if rows else None
+
+
+def _db_pop_one() -> dict[str, Any] | None:
+    """Atomically claim one queued job as 'working'. Returns dict or None."""
+    try:
+        row = _claim_one(_con())
+    except sqlite3.Error:
+        _reset_con()
+        raise
+    if row is None:
+        return None
+
+    task_obj: Any = row["task"]
+    if isinstance(task_obj, str | bytes | bytearray):
+        with suppress(Exception):
+            task_obj = jsonutil.loads(task_obj)
+    if isinstance(task_obj, bytes | bytearray):
+        task_obj = task_obj.decode("utf-8", errors="ignore")
+
+    if not isinstance(task_obj, dict):
+        task_obj = {"task": "unknown", "payload": {"raw": task_obj}}
+
+    return {"id": int(row["id"]), "task": task_obj, "key": row["key"]}
+
+
 def _db_done(jid: int, result: dict[str, Any] | None, err: dict[str, Any] | None) -> None:
-    con = _connect()
+    con = _con()
     cur = con.cursor()
     try:
         cur.execute(
-            """
-            UPDATE jobs
-               SET status=?,
-                   result=?,
-                   err=?
-             WHERE id=?
-            """,
+            _MARK_DONE,
             (
                 "done" if err is None else "error",
-                json.dumps(result or {}, ensure_ascii=False),
-                json.dumps(err, ensure_ascii=False) if err is not None else None,
+                jsonutil.dumps(result or {}),
+                jsonutil.dumps(err) if err is not None else None,
                 jid,
             ),
         )
         con.commit()
-    finally:
-        with suppress(Exception):
-            con.close()
+    except sqlite3.Error:
+        _reset_con()
+        raise
 
 
 def _dispatch(task_name: str, payload: dict[str, Any]) -> dict[str, Any]:
-    name = (task_name or "").lower().strip()
-    handler: Callable[[str, dict[str, Any]], dict[str, Any]] | None = HANDLERS.get(name)
+    # exact hit first (producers normally send canonical names); otherwise the cached,
+    # interned key from services.agents. HANDLERS is read live so register() still works.
+    handler: Callable[[str, dict[str, Any]], dict[str, Any]] | None = HANDLERS.get(task_name)
+    if handler is not None:
+        name = task_name
+    else:
+        name = task_key(task_name)
+        handler = HANDLERS.get(name)
     if handler is None:
         return {
             "ok": False,
@@ -108,20 +152,24 @@ def _dispatch(task_name: str, payload: dict[str, Any]) -> dict[str, Any]:
 
 
 def main() -> None:
-    print(f"worker: connected to {DB_PATH}", flush=True)
-    print("worker: mode=direct-db", flush=True)
+    log = worker_logger()
+    log.info("worker: connected to %s", DB_PATH)
+    log.info("worker: mode=direct-db")
 
+    idle_sleep = IDLE_SLEEP_MIN_SEC
     while True:
         try:
             item = _db_pop_one()
         except Exception as e:
-            print("worker: pop failed:", e, flush=True)
+            log.info("worker: pop failed: %s", e)
             time.sleep(0.5)
             continue
 
         if not item:
-            time.sleep(0.25)
+            time.sleep(idle_sleep)
+            idle_sleep = min(idle_sleep * 2, IDLE_SLEEP_MAX_SEC)
             continue
+        idle_sleep = IDLE_SLEEP_MIN_SEC
 
         jid = int(item["id"])
         task_obj = item["task"]
@@ -139,9 +187,9 @@ def main() -> None:
                 err=None if result.get("ok") else result,
             )
         except Exception as e:
-            print(f"worker: done failed for {jid}: {e}", flush=True)
+            log.info("worker: done failed for %s: %s", jid, e)
         else:
-            print("worker: done", jid, f"task={task_name!r}", flush=True)
+            log.info("worker: done %s task=%r", jid, task_name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,35 @@
+# services/worker/log.py
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+_lock = threading.Lock()
+_listener: QueueListener | None = None
+
+
+def worker_logger() -> logging.Logger:
+    """
+    The "velu.worker" logger. Records are handed to a queue and written to stdout by a
+    listener thread, so the job loop never blocks on a stdout write + flush.
+    Output stays one plain message per line (same as the old print(..., flush=True)).
+    """
+    global _listener
+    log = logging.getLogger("velu.worker")
+    with _lock:
+        if _listener is None:
+            records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+            out = logging.StreamHandler(sys.stdout)
+            out.setFormatter(logging.Formatter("%(message)s"))
+            _listener = QueueListener(records, out)
+            _listener.start()
+            # drain whatever is still queued when the process exits
+            atexit.register(_listener.stop)
+            log.addHandler(QueueHandler(records))
+            log.setLevel(logging.INFO)
+            log.propagate = False
+    return log
@@ -1,28 +1,38 @@
 from __future__ import annotations
 
+import functools
 import importlib
 import io
-import json
 import os
 import sys
 import threading
-import time
 from contextlib import redirect_stderr, redirect_stdout
 from typing import Any
 
-import pytest
-
 from orchestrator.router_client import route
+from services.common import jsonutil
+from services.worker.log import worker_logger
+
+_FALSY = frozenset({"0", "", "false", "no"})
 
 
 def _truthy(v: str | None) -> bool:
-    return bool(v) and v.lower() not in {"0", "", "false", "no"}
+    return bool(v) and v.lower() not in _FALSY
 
 
+@functools.cache
 def _q():
+    # resolved once; the module object never changes after import
     return importlib.import_module("services.queue.sqlite_queue")
 
 
+@functools.cache
+def _pytest():
+    # imported on the first run_tests job; workers serving only plan/generate_code
+    # (and the API's embedded worker) never pay for pytest and its plugins
+    return importlib.import_module("pytest")
+
+
 # optional embedded worker (useful for smoke tests started via API)
 def _start_embedded_worker() -> None:
     if getattr(_start_embedded_worker, "_started", False):
@@ -45,7 +55,37 @@ if _truthy(os.getenv("EMBEDDED_WORKER", "1")):
     _start_embedded_worker()
 
 
+@functools.lru_cache(maxsize=8)
+def _router_takes_task_dict(fn: Any) -> bool | None:
+    """
+    Resolve route()'s call shape once per router object:
+    True -> route({"task", "payload"}), False -> route(name, payload), None -> unknown.
+    """
+    import inspect  # only needed once per router, keep it off the import path
+
+    try:
+        sig = inspect.signature(fn)
+    except (TypeError, ValueError):
+        return None
+    try:
+        sig.bind({})
+        return True
+    except TypeError:
+        pass
+    try:
+        sig.bind("", {})
+        return False
+    except TypeError:
+        return None
+
+
 def _call_router(name: str, payload: dict) -> Any:
+    takes_dict = _router_takes_task_dict(route)
+    if takes_dict is True:
+        return route({"task": name, "payload": payload})
+    if takes_dict is False:
+        return route(name, payload)
+    # shape unknown (e.g. builtin/C callable): probe with the dict form first
     try:
         return route({"task": name, "payload": payload})
     except TypeError as te:
@@ -57,16 +97,19 @@ def _call_router(name: str, payload: dict) -> Any:
 
 
 def _normalize_result(raw: Any) -> dict:
-    if isinstance(raw, (bytes, bytearray)):
-        raw = raw.decode("utf-8", errors="replace")
-    if isinstance(raw, str):
+    # routers almost always hand back a plain dict: return it before any other check
+    if type(raw) is dict:
+        return raw
+    if isinstance(raw, (str, bytes, bytearray)):
         try:
-            parsed = json.loads(raw)
-            if isinstance(parsed, dict):
-                return parsed
-            return {"ok": True, "data": parsed}
+            parsed = jsonutil.loads(raw)
         except Exception:
+            if not isinstance(raw, str):
+                raw = raw.decode("utf-8", errors="replace")
             return {"ok": True, "data": raw}
+        if isinstance(parsed, dict):
+            return parsed
+        return {"ok": True, "data": parsed}
     if isinstance(raw, dict):
         return raw
     return {"ok": True, "data": raw}
@@ -124,26 +167,60 @@ def _task_plan_pipeline(rec: dict) -> dict:
     }
 
 
+# directories _write_files has already created (skips a makedirs per job)
+_made_dirs: set[str] = set()
+
+
+def _write_files(files: dict[str, str | bytes]) -> None:
+    """
+    Write generated files under the working directory: each parent dir is created once,
+    content is encoded once and written with a single os.write per file.
+    Paths are resolved with plain os.path string ops and must stay inside the cwd.
+    """
+    root = os.path.realpath(os.getcwd())
+    root_with_sep = root + os.sep
+    dests: dict[str, str | bytes] = {}
+    for path, content in files.items():
+        dest = os.path.normpath(os.path.join(root, path))
+        if not dest.startswith(root_with_sep):
+            raise ValueError(f"refusing to write outside {root}: {path}")
+        dests[dest] = content
+
+    for d in sorted({os.path.dirname(p) for p in dests} - _made_dirs):
+        os.makedirs(d, exist_ok=True)
+        _made_dirs.add(d)
+    for path, content in dests.items():
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        except FileNotFoundError:
+            # parent removed since we created it
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view) :]
+        finally:
+            os.close(fd)
+
+
+# generated file bodies; the module is fixed bytes, the test only needs the module name
+_GREET_PY = b'def greet(name: str) -> str:\n    return f"Hello, {name}!"\n'
+_TEST_TMPL = (
+    "from {module} import greet\n\ndef test_greet():\n    assert greet('Velu') == 'Hello, Velu!'\n"
+)
+
+
 def _task_generate_code(rec: dict) -> dict:
     payload = _as_dict_payload(rec.get("payload"))
     idea = payload.get("idea", "demo")
     module = payload.get("module", "hello_mod")
 
-    os.makedirs("src", exist_ok=True)
-    os.makedirs("tests", exist_ok=True)
-
     mod_path = f"src/{module}.py"
     test_path = f"tests/test_{module}.py"
 
-    with open(mod_path, "w", encoding="utf-8") as f:
-        f.write("def greet(name: str) -> str:\n" '    return f"Hello, {name}!"\n')
-
-    with open(test_path, "w", encoding="utf-8") as f:
-        f.write(
-            f"from {module} import greet\n\n"
-            "def test_greet():\n"
-            "    assert greet('Velu') == 'Hello, Velu!'\n"
-        )
+    _write_files({mod_path: _GREET_PY, test_path: _TEST_TMPL.format(module=module)})
 
     return {
         "ok": True,
@@ -164,14 +241,19 @@ def _task_run_tests(rec: dict) -> dict:
     module = (code_result or {}).get("module", "hello_mod")
     test_path = f"tests/test_{module}.py"
 
+    # resolved per call, like _write_files, so both follow the current cwd
     src = os.path.abspath("src")
     if src not in sys.path:
         sys.path.insert(0, src)
+    # pytest runs in this process: drop modules a previous run imported, otherwise a
+    # regenerated module (or its test) would be served stale from sys.modules
+    for name in (module, f"test_{module}", f"tests.test_{module}"):
+        sys.modules.pop(name, None)
 
     buf_out = io.StringIO()
     buf_err = io.StringIO()
     with redirect_stdout(buf_out), redirect_stderr(buf_err):
-        rc = pytest.main(["-q", test_path])
+        rc = _pytest().main(["-q", test_path])
     if rc != 0:
         raise RuntimeError(
             f"pytest returned exit code {rc}\n{buf_out.getvalue()}\n{buf_err.getvalue()}"
@@ -180,37 +262,51 @@ def _task_run_tests(rec: dict) -> dict:
     return {"ok": True, "stdout": buf_out.getvalue(), "stderr": buf_err.getvalue()}
 
 
-def process_job(rec: dict) -> dict:
-    name = rec["task"]
+def _task_plan(rec: dict) -> dict:
+    payload = _as_dict_payload(rec.get("payload"))
+    # Pipeline only when explicitly requested AND a module is provided.
+    if _truthy(os.getenv("WORKER_ENABLE_PIPELINE")) and str(payload.get("module", "")).strip():
+        return _task_plan_pipeline(rec)
+    res = _normalize_result(_call_router("plan", payload))
+    module = str(payload.get("module", "")).strip()
+    if module:
+        idea = str(payload.get("idea", "")).strip()
+        res.setdefault("plan", f"{idea} via {module}")
+    return res
+
+
+def _task_routed(rec: dict) -> dict:
+    payload = _as_dict_payload(rec.get("payload"))
+    return _normalize_result(_call_router(rec["task"], payload))
 
-    if name == "fail_n":
-        return _task_fail_n(rec)
 
-    if name == "plan":
-        payload = _as_dict_payload(rec.get("payload"))
-        # Pipeline only when explicitly requested AND a module is provided.
-        if _truthy(os.getenv("WORKER_ENABLE_PIPELINE")) and str(payload.get("module", "")).strip():
-            return _task_plan_pipeline(rec)
-        res = _normalize_result(_call_router(name, payload))
-        module = str(payload.get("module", "")).strip()
-        if module:
-            idea = str(payload.get("idea", "")).strip()
-            res.setdefault("plan", f"{idea} via {module}")
-        return res
+# built-in tasks; anything else goes to the router
+_TASK_TABLE = {
+    "fail_n": _task_fail_n,
+    "plan": _task_plan,
+    "generate_code": _task_generate_code,
+    "run_tests": _task_run_tests,
+}
 
-    if name == "generate_code":
-        return _task_generate_code(rec)
 
-    if name == "run_tests":
-        return _task_run_tests(rec)
+def process_job(rec: dict) -> dict:
+    return _TASK_TABLE.get(rec["task"], _task_routed)(rec)
 
-    payload = _as_dict_payload(rec.get("payload"))
-    return _normalize_result(_call_router(name, payload))
+
+def _finish_each(q: Any, done: list[tuple[int, Any]]) -> None:
+    for job_id, result in done:
+        try:
+            q.finish(job_id, result)
+        except Exception as e:
+            q.fail(job_id, f"{type(e).__name__}: {e}")
+    done.clear()
 
 
 def main() -> None:
-    _q().init()
-    print("worker: online", flush=True)
+    q = _q()
+    q.init()
+    log = worker_logger()
+    log.info("worker: online")
     processed = 0
 
     run_once = _truthy(os.getenv("WORKER_RUN_ONCE"))
@@ -222,28 +318,38 @@ def main() -> None:
     if run_once and (max_jobs is None or max_jobs > 1):
         max_jobs = 1
 
+    # completed (job_id, result) pairs; committed by the next dequeue() together with
+    # its claim, so each job costs one transaction and is visible before the next loads
+    done: list[tuple[int, Any]] = []
     try:
         while True:
-            job_id = _q().dequeue()
+            try:
+                job_id = q.dequeue(done)
+            except (TypeError, ValueError):
+                # a result that does not encode: record each job on its own, as before
+                _finish_each(q, done)
+                job_id = q.dequeue()
+            done.clear()
             if job_id is None:
                 if max_jobs is not None and processed >= max_jobs:
-                    print(f"worker: exit (processed={processed})", flush=True)
+                    log.info("worker: exit (processed=%d)", processed)
                     return
-                time.sleep(0.5)
+                q.wait_for_work(0.5)
                 continue
 
-            rec = _q().load(job_id)
+            rec = q.load(job_id)
             try:
                 result = process_job(rec)
-                _q().finish(job_id, result)
+                done.append((job_id, result))
                 processed += 1
-                print(f"worker: done {job_id}", flush=True)
+                log.info("worker: done %s", job_id)
             except Exception as e:
-                _q().fail(job_id, f"{type(e).__name__}: {e}")
-                print(f"worker: error {job_id}: {e}", flush=True)
+                q.fail(job_id, f"{type(e).__name__}: {e}")
+                log.info("worker: error %s: %s", job_id, e)
     except KeyboardInterrupt:
-        print("worker: stopping after current job...", flush=True)
-        print(f"worker: exit (processed={processed})", flush=True)
+        log.info("worker: stopping after current job...")
+        _finish_each(q, done)
+        log.info("worker: exit (processed=%d)", processed)
 
 
 if __name__ == "__main__":
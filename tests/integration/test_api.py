@@ -1,5 +1,6 @@
 import json
 
+import pytest
 from fastapi.testclient import TestClient
 
 from services.app_server.main import app
@@ -30,3 +31,141 @@ def test_tasks_accept_and_echo(tmp_path, monkeypatch):
     rec = json.loads(log[-1])
     assert rec["task"] == "plan"
     assert rec["payload"] == {"p": "q"}
+
+
+def test_tasks_batch_enqueues_in_order(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("TASK_LOG", str(tmp_path / "tasks.log"))
+    items = [{"task": "plan", "payload": {"i": i}} for i in range(3)]
+    r = client.post("/tasks/batch", json=items)
+    assert r.status_code == 200
+    ids = r.json()["job_ids"]
+    assert len(ids) == 3 and ids == sorted(ids)
+
+    log = (tmp_path / "tasks.log").read_text(encoding="utf-8").strip().splitlines()
+    assert [json.loads(line)["payload"] for line in log] == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+    r = client.get(f"/results/{ids[-1]}")
+    assert r.json()["item"]["payload"] == {"i": 2}
+
+
+def test_tasks_accept_big_ints(tmp_path, monkeypatch):
+    # beyond orjson's 64-bit range: must fall back to stdlib json, not 500
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("TASK_LOG", str(tmp_path / "tasks.log"))
+    big = 2**70 + 1  # not exactly representable as a float
+    r = client.post("/tasks", json={"task": "plan", "payload": {"n": big}})
+    assert r.status_code == 200
+    assert r.json()["received"]["payload"] == {"n": big}
+    log = (tmp_path / "tasks.log").read_text(encoding="utf-8").strip().splitlines()
+    assert json.loads(log[-1])["payload"] == {"n": big}
+
+
+def test_list_tasks_after_big_int(tmp_path, monkeypatch):
+    # the ring keeps the entry; later GET /tasks must keep serializing it
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.delenv("TASK_LOG", raising=False)
+    r = client.post("/tasks", json={"task": "plan", "payload": {"n": 2**70}})
+    assert r.status_code == 200
+    for _ in range(2):  # second call is served from the cached body
+        r = client.get("/tasks", params={"limit": 5})
+        assert r.status_code == 200
+        assert r.json()["items"][0]["payload"] == {"n": 2**70}
+
+
+def test_task_log_keeps_unknown_fields(tmp_path, monkeypatch):
+    # TASK_LOG records the object as sent, not just the fields TaskIn knows about
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("TASK_LOG", str(tmp_path / "tasks.log"))
+    sent = {"task": "plan", "payload": {}, "extra": "x"}
+    assert client.post("/tasks", json=sent).status_code == 200
+    assert client.post("/tasks/batch", json=[sent]).status_code == 200
+    log = (tmp_path / "tasks.log").read_text(encoding="utf-8").strip().splitlines()
+    assert [json.loads(line) for line in log] == [sent, sent]
+
+
+def test_task_log_decodes_body_once(tmp_path, monkeypatch):
+    from services.app_server import main
+
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setenv("TASK_LOG", str(tmp_path / "tasks.log"))
+    calls = []
+    real_loads = main.jsonutil.loads
+    monkeypatch.setattr(main.jsonutil, "loads", lambda b: calls.append(b) or real_loads(b))
+    body = json.dumps([{"task": "plan", "payload": {"i": i}} for i in range(2)]).encode()
+    headers = {"content-type": "application/json"}
+    assert client.post("/tasks/batch", content=body, headers=headers).status_code == 200
+    assert calls.count(body) == 1  # a background worker may decode its own rows meanwhile
+
+    r = client.post("/tasks", content=b"{not json", headers=headers)
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["type"] == "json_invalid"
+
+
+def test_tasks_coerce_task_like_before(tmp_path, monkeypatch):
+    # same coercion as the old dict endpoint: str(task) for any JSON value, payload or {}
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.delenv("TASK_LOG", raising=False)
+    cases = [
+        ({"task": None}, "None", {}),
+        ({"task": 5, "payload": None}, "5", {}),
+        ({"task": True}, "True", {}),
+        ({"task": ["a"]}, "['a']", {}),
+        ({"payload": [1, 2]}, "plan", [1, 2]),
+    ]
+    for body, task, payload in cases:
+        r = client.post("/tasks", json=body)
+        assert r.status_code == 200, body
+        assert r.json()["received"] == {"task": task, "payload": payload}
+        assert client.post("/tasks/batch", json=[body]).status_code == 200, body
+
+
+def test_results_keep_big_ints_exact(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "jobs.db"))
+    big = 2**70 + 1
+    job_id = client.post("/tasks", json={"task": "plan", "payload": {"n": big}}).json()["job_id"]
+    assert client.get(f"/results/{job_id}").json()["item"]["payload"] == {"n": big}
+
+
+def test_task_writer_isolates_failures(monkeypatch):
+    from concurrent.futures import Future
+
+    from fastapi import HTTPException
+
+    from services.app_server import main
+
+    class FakeQueue:
+        def enqueue_many(self, jobs):
+            if any(j["task"] == "bad" for j in jobs):
+                raise ValueError("bad job")
+            return list(range(len(jobs)))
+
+    monkeypatch.setattr(main, "_q", FakeQueue)
+    good: Future = Future()
+    bad: Future = Future()
+    main._writer._flush([(None, [], [{"task": "ok"}], good), (None, [], [{"task": "bad"}], bad)])
+    assert good.result(timeout=1) == [0]
+    with pytest.raises(HTTPException):
+        bad.result(timeout=1)
+
+
+def test_task_writer_survives_unexpected_errors(monkeypatch):
+    from fastapi import HTTPException
+
+    from services.app_server import main
+
+    writer = main._TaskWriter()
+    real_flush = writer._flush
+    calls = []
+
+    def flaky_flush(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        real_flush(batch)
+
+    monkeypatch.setattr(writer, "_flush", flaky_flush)
+    with pytest.raises(HTTPException):
+        writer.submit(None, [], []).result(timeout=2)
+    # the thread kept running and serves the next request
+    assert writer.submit(None, [], []).result(timeout=2) == []
@@ -30,6 +30,26 @@ def test_payload_too_large(monkeypatch, tmp_path):
     assert r.json()["detail"] == "payload too large"
 
 
+def test_payload_too_large_without_content_length(monkeypatch, tmp_path):
+    # chunked upload: no Content-Length to check, the streamed size still hits the cap
+    monkeypatch.setenv("MAX_REQUEST_BYTES", "64")
+    monkeypatch.setenv("TASK_LOG", str(tmp_path / "tasks.log"))
+    c = client()
+
+    def chunks():
+        yield b'{"task": "plan", "payload": {"x": "'
+        yield b"y" * 200
+        yield b'"}}'
+
+    headers = {"content-type": "application/json"}
+    r = c.post("/tasks", content=chunks(), headers=headers)
+    assert r.status_code == 413
+    assert r.json()["detail"] == "payload too large"
+
+    small = iter([b'{"task": "plan", ', b'"payload": {}}'])
+    assert c.post("/tasks", content=small, headers=headers).status_code == 200
+
+
 def test_rate_limit(monkeypatch, tmp_path):
     monkeypatch.setenv("RATE_REQUESTS", "3")
     monkeypatch.setenv("RATE_WINDOW_SEC", "2")
@@ -23,3 +23,15 @@ def test_sqlite_roundtrip(tmp_path, monkeypatch):
     assert len(items) >= 2
     assert items[0]["payload"] == {"i": 1}
     assert items[1]["payload"] == {"i": 0}
+
+
+def test_sqlite_insert_non_str_keys_and_big_ints(tmp_path, monkeypatch):
+    from services.app_server import store_sqlite
+
+    monkeypatch.setenv("TASK_DB", str(tmp_path / "tasks.db"))
+    store_sqlite.init_db()
+    store_sqlite.insert({"task": "x", "payload": {1: "a"}})
+    store_sqlite.insert({"task": "x", "payload": {"n": 2**70 + 1}})
+    items = list(store_sqlite.list_recent(2))
+    # read back exactly, not rounded through a float
+    assert [it["payload"] for it in items] == [{"n": 2**70 + 1}, {"1": "a"}]
@@ -10,7 +10,7 @@ import subprocess
 import tempfile
 from pathlib import Path
 
-from agents.git_agent.agent import GitIntegrationAgent
+from agents.git_agent.agent import GitIntegrationAgent, branch_name, compile_branch_pattern
 
 
 def _init_repo(tmp: Path) -> None:
@@ -62,3 +62,10 @@ def test_feature_commit_smoke() -> None:
         assert bname.startswith("feat/")
     finally:
         shutil.rmtree(tmp)
+
+
+def test_branch_patterns_compiled() -> None:
+    assert branch_name("feature", "router") == "feat/router"
+    assert branch_name("fix", "router") == "fix/router"
+    assert compile_branch_pattern("features/{scope}-wip")("router") == "features/router-wip"
+    assert compile_branch_pattern("x/{scope}/{scope}")("a") == "x/a/a"
@@ -7,25 +7,31 @@ API = "http://127.0.0.1:8010"
 HEADERS = {"X-API-Key": os.environ.get("API_KEYS", "dev")}
 
 
-def wait_ready(timeout=30):
-    t0 = time.time()
-    while time.time() - t0 < timeout:
+def wait_ready(sess, timeout=30):
+    # short first sleeps so an already-up server is seen at once; back off to 0.5s
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while time.monotonic() < deadline:
         try:
-            r = requests.get(f"{API}/ready", timeout=2)
+            r = sess.get(f"{API}/ready", timeout=1)
             if r.ok and r.json().get("ok"):
                 return True
         except Exception:
             pass
-        time.sleep(0.5)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
     raise RuntimeError("/ready never went ok")
 
 
 def test_pipeline_plan():
-    wait_ready()
+    # one keep-alive connection for the whole run
+    sess = requests.Session()
+    sess.headers.update(HEADERS)
+    wait_ready(sess)
     # enqueue
-    r = requests.post(
+    r = sess.post(
         f"{API}/tasks",
-        headers={**HEADERS, "Content-Type": "application/json"},
+        headers={"Content-Type": "application/json"},
         json={"task": "plan", "payload": {"idea": "demo", "module": "hello_mod"}},
         timeout=5,
     )
@@ -34,7 +40,7 @@ def test_pipeline_plan():
 
     # poll result
     for _ in range(40):
-        rr = requests.get(f"{API}/results/{job_id}", headers=HEADERS, timeout=5)
+        rr = sess.get(f"{API}/results/{job_id}", timeout=5)
         rr.raise_for_status()
         item = rr.json()["item"]
         if item["status"] in ("done", "error"):
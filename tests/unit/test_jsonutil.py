@@ -0,0 +1,18 @@
+from services.common import jsonutil
+
+
+def test_loads_keeps_big_ints_exact():
+    big = 2**70 + 1
+    assert jsonutil.loads(f'{{"n": {big}, "neg": {-big}}}') == {"n": big, "neg": -big}
+    assert jsonutil.loads(b"[18446744073709551616]") == [2**64]
+
+
+def test_loads_long_digit_strings_and_floats():
+    digits = "1234567890123456789012345"
+    assert jsonutil.loads(f'{{"id": "{digits}", "x": 1.5}}') == {"id": digits, "x": 1.5}
+
+
+def test_dumps_big_ints_and_non_str_keys():
+    assert jsonutil.loads(jsonutil.dumps({1: 2**70})) == {"1": 2**70}
+    assert jsonutil.dumps_line({"a": 2**70}).endswith(b"\n")
+    assert jsonutil.loads(jsonutil.dumps_bytes([2**70])) == [2**70]
@@ -101,3 +101,18 @@ def test_append_task_with_ts_column(tmp_path, monkeypatch):
     # JSONL file should also exist
     assert log_path.exists()
     assert log_path.read_text().strip() != ""
+
+
+def test_tail_lines_skips_blanks_across_blocks(tmp_path, monkeypatch):
+    """
+    _tail_lines() keeps reading back until it has `limit` non-empty lines (or hits BOF).
+    """
+    from services.app_server import store
+
+    monkeypatch.setattr(store, "_TAIL_BLOCK", 16)
+    log_path = tmp_path / "tasks.log"
+    log_path.write_bytes(b"first\n" + b"\n" * 4000 + b"second\n\n\nthird\n\n")
+
+    assert store._tail_lines(str(log_path), 3) == ["third", "second", "first"]
+    assert store._tail_lines(str(log_path), 2) == ["third", "second"]
+    assert store._tail_lines(str(log_path), 10) == ["third", "second", "first"]